@@ -151,7 +151,7 @@ def problem(verbose):
                 grid[p[1]] = (p[2], p[3])
         return grid
 
-    goal_coords = to_coordinates(problem.goals)
+    goal_coords = to_coordinates(problem.goal)
 
     def manhattan_distance_heuristic(state):
         state_coords = to_coordinates(state.predicates)
@@ -1,2 +1,12 @@
 from .pyddl import *
 from .planner import *
+from .task import *
+from .successors import *
+from .heuristics import *
+from .search import *
+from .parallel import *
+from .hooks import *
+from .regression import *
+from .topk import *
+from .patterns import *
+from .landmarks import *
@@ -0,0 +1,447 @@
+#!/usr/bin/env python
+"""
+Benchmark suite for the planner.
+
+Runs the example domains (eight-puzzle, missionaries and cannibals, butler
+story) and scaled instances built by the generators below, each in its own
+forked process, and writes one JSON object per benchmark with its
+SearchStatistics (grounding and search time, plan length...), expansions
+per second and peak memory (in bytes), for regression tracking:
+
+    python -m pyddl.benchmark [-k substring] [-o results.jsonl]
+"""
+from __future__ import print_function
+import json
+import multiprocessing
+import queue
+import random
+import sys
+from time import monotonic
+from .pyddl import Domain, Problem, Action, neg
+from .planner import planner
+from .search import SearchStatistics, peak_memory
+
+########## GENERATORS ##########
+
+def _move(name, inc, blank_x, blank_y, moving):
+    """Slides a tile from (px, py) into the blank at (blank_x, blank_y)"""
+    return Action(
+        name,
+        parameters=(
+            ('tile', 't'),
+            ('position', 'px'),
+            ('position', 'py'),
+            ('position', moving),
+        ),
+        preconditions=(
+            (inc, moving, 'py' if moving == 'by' else 'px'),
+            ('blank', blank_x, blank_y),
+            ('at', 't', 'px', 'py'),
+        ),
+        effects=(
+            neg(('blank', blank_x, blank_y)),
+            neg(('at', 't', 'px', 'py')),
+            ('blank', 'px', 'py'),
+            ('at', 't', blank_x, blank_y),
+        ),
+    )
+
+def n_puzzle(size=3, moves=20, seed=0, tiles=None, **kwargs):
+    """
+    Sliding puzzle of size x size positions, in the domain of
+    eight_puzzle_example.py
+    @arg size : number of rows and columns
+    @arg moves : length of the random walk from the goal giving init
+    @arg seed : seed of the random walk
+    @arg tiles : if given, the initial grid as a tuple of rows of tile
+                 numbers (0 for the blank), instead of a random walk
+    @arg kwargs : other Problem keyword arguments
+    """
+    domain = Domain((
+        _move('move-up', 'dec', 'px', 'by', 'by'),
+        _move('move-down', 'inc', 'px', 'by', 'by'),
+        _move('move-left', 'dec', 'bx', 'py', 'bx'),
+        _move('move-right', 'inc', 'bx', 'py', 'bx'),
+    ))
+    positions = tuple(range(1, size + 1))
+    goal_tiles = tuple(tuple(y * size + x for x in range(size)) for y in range(size))
+    if tiles is None:
+        grid = [list(row) for row in goal_tiles]
+        x, y = 0, 0
+        rng = random.Random(seed)
+        for _ in range(moves):
+            neighbours = [(x + dx, y + dy) for dx, dy in ((1, 0), (-1, 0), (0, 1), (0, -1))
+                          if 0 <= x + dx < size and 0 <= y + dy < size]
+            nx, ny = rng.choice(neighbours)
+            grid[y][x], grid[ny][nx] = grid[ny][nx], grid[y][x]
+            x, y = nx, ny
+        tiles = grid
+
+    def _atoms(grid):
+        atoms = list()
+        for y, row in enumerate(grid):
+            for x, tile in enumerate(row):
+                if tile:
+                    atoms.append(('at', tile, x + 1, y + 1))
+                else:
+                    atoms.append(('blank', x + 1, y + 1))
+        return atoms
+
+    order = [('inc', p, p + 1) for p in positions[:-1]] + \
+        [('dec', p + 1, p) for p in positions[:-1]]
+    return Problem(
+        domain,
+        {
+            'tile': tuple(range(1, size * size)),
+            'position': positions,
+        },
+        init=tuple(order + _atoms(tiles)),
+        goal=tuple(_atoms(goal_tiles)),
+        **kwargs
+    )
+
+def manhattan_heuristic(problem):
+    """Sum of the Manhattan distances of the tiles of an n_puzzle to the goal"""
+    goal = {p[1]: (p[2], p[3]) for p in problem.goal if p[0] == 'at'}
+    def distance(atom):
+        if atom[0] != 'at' or atom[1] not in goal:
+            return 0
+        x, y = goal[atom[1]]
+        return abs(atom[2] - x) + abs(atom[3] - y)
+    if not problem.compiled:
+        return lambda state: sum(distance(p) for p in state.predicates)
+
+    task = problem.compile()
+    distances = list()
+    def h(state):
+        # Distances of atoms by id, extended as new atoms are interned
+        while len(distances) < len(task.atoms):
+            distances.append(distance(task.atoms[len(distances)]))
+        bits = state.bits
+        total = 0
+        while bits:
+            low = bits & -bits
+            total += distances[low.bit_length() - 1]
+            bits ^= low
+        return total
+    return h
+
+def missionaries_cannibals(missionaries=3, cannibals=None, capacity=2, **kwargs):
+    """
+    Missionaries and cannibals crossing a river, in the domain of
+    missionaries_cannibals_example.py
+    @arg missionaries : number of missionaries
+    @arg cannibals : number of cannibals (as many as missionaries by default)
+    @arg capacity : number of people the boat carries
+    @arg kwargs : other Problem keyword arguments
+    """
+    if cannibals is None:
+        cannibals = missionaries
+    domain = Domain((
+        Action(
+            'cross-right',
+            preconditions=(
+                ('at', 'left-bank'),
+                ('>', ('occupants',), 0),
+            ),
+            effects=(
+                neg(('at', 'left-bank')),
+                ('at', 'right-bank'),
+            ),
+        ),
+        Action(
+            'cross-left',
+            preconditions=(
+                ('at', 'right-bank'),
+                ('>', ('occupants',), 0),
+            ),
+            effects=(
+                neg(('at', 'right-bank')),
+                ('at', 'left-bank'),
+            ),
+        ),
+        Action(
+            'onboard-cannibal',
+            parameters=(
+                ('location', 'l'),
+            ),
+            preconditions=(
+                ('at', 'l'),
+                ('>', ('cannibals', 'l'), 0),
+                ('<', ('occupants',), capacity),
+            ),
+            effects=(
+                ('-=', ('cannibals', 'l'), 1),
+                ('+=', ('cannibals', 'boat'), 1),
+                ('+=', ('occupants',), 1),
+            ),
+        ),
+        Action(
+            'onboard-missionary',
+            parameters=(
+                ('location', 'l'),
+            ),
+            preconditions=(
+                ('at', 'l'),
+                ('>', ('missionaries', 'l'), 0),
+                ('>', ('missionaries', 'l'), ('cannibals', 'l')),
+                ('<', ('occupants',), capacity),
+            ),
+            effects=(
+                ('-=', ('missionaries', 'l'), 1),
+                ('+=', ('missionaries', 'boat'), 1),
+                ('+=', ('occupants',), 1),
+            ),
+        ),
+        Action(
+            'offboard-cannibal',
+            parameters=(
+                ('location', 'l'),
+            ),
+            preconditions=(
+                ('at', 'l'),
+                ('>', ('cannibals', 'boat'), 0),
+                ('>', ('missionaries', 'l'), ('cannibals', 'l')),
+            ),
+            effects=(
+                ('-=', ('cannibals', 'boat'), 1),
+                ('-=', ('occupants',), 1),
+                ('+=', ('cannibals', 'l'), 1),
+            ),
+        ),
+        Action(
+            'offboard-missionary',
+            parameters=(
+                ('location', 'l'),
+            ),
+            preconditions=(
+                ('at', 'l'),
+                ('>', ('missionaries', 'boat'), 0),
+            ),
+            effects=(
+                ('-=', ('missionaries', 'boat'), 1),
+                ('-=', ('occupants',), 1),
+                ('+=', ('missionaries', 'l'), 1),
+            ),
+        ),
+    ))
+    return Problem(
+        domain,
+        {
+            'location': ('left-bank', 'right-bank'),
+        },
+        init=(
+            ('at', 'left-bank'),
+            ('=', ('missionaries', 'boat'), 0),
+            ('=', ('cannibals', 'boat'), 0),
+            ('=', ('occupants',), 0),
+            ('=', ('missionaries', 'left-bank'), missionaries),
+            ('=', ('cannibals', 'left-bank'), cannibals),
+            ('=', ('missionaries', 'right-bank'), 0),
+            ('=', ('cannibals', 'right-bank'), 0),
+        ),
+        goal=(
+            ('=', ('missionaries', 'right-bank'), missionaries),
+            ('=', ('cannibals', 'right-bank'), cannibals),
+        ),
+        **kwargs
+    )
+
+def butler_story(characters=2, objects=2, **kwargs):
+    """
+    The butler poisoning the lord, in the domain of test_butler_story.py,
+    with extra characters and objects to carry around
+    @arg characters : number of characters (at least 2: butler and lord)
+    @arg objects : number of objects (at least 2: wine and poison)
+    @arg kwargs : other Problem keyword arguments
+    """
+    domain = Domain((
+        Action(
+            'Put-poison',
+            parameters=(
+                ('owner', 'o'),
+            ),
+            preconditions=(
+                ('have', 'o', 'poison'),
+                ('have', 'o', 'wine'),
+            ),
+            effects=(
+                neg(('have', 'o', 'poison')),
+                ('poisoned', 'wine'),
+            ),
+        ),
+        Action(
+            'Carry',
+            parameters=(
+                ('owner', 'from'),
+                ('object', 'obj'),
+                ('target', 'to'),
+            ),
+            preconditions=(
+                ('have', 'from', 'obj'),
+                ('!=', 'from', 'to'),
+            ),
+            effects=(
+                neg(('have', 'from', 'obj')),
+                ('have', 'to', 'obj'),
+            ),
+        ),
+        Action(
+            'Drink',
+            parameters=(
+                ('owner', 'o'),
+                ('object', 'obj'),
+            ),
+            preconditions=(
+                ('have', 'o', 'obj'),
+            ),
+            effects=(
+                neg(('have', 'o', 'obj')),
+                ('drinking', 'o', 'obj'),
+            ),
+        ),
+        Action(
+            'Fall-down',
+            parameters=(
+                ('owner', 'o'),
+                ('object', 'obj'),
+            ),
+            preconditions=(
+                ('drinking', 'o', 'obj'),
+                ('poisoned', 'obj')
+            ),
+            effects=(
+                ('dead', 'o'),
+                neg(('drinking', 'o', 'obj')),
+            ),
+        ),
+    ))
+    people = ('butler', 'lord') + tuple('guest%d' % i for i in range(characters - 2))
+    things = ('wine', 'poison') + tuple('item%d' % i for i in range(objects - 2))
+    # Extra objects start with the characters in turn
+    init = [('have', 'butler', 'poison'), ('have', 'butler', 'wine')]
+    for i, thing in enumerate(things[2:]):
+        init.append(('have', people[i % len(people)], thing))
+    return Problem(
+        domain,
+        {
+            'owner': people,
+            'target': people,
+            'object': things,
+        },
+        init=tuple(init),
+        goal=(
+            ('dead', 'lord'),
+        ),
+        **kwargs
+    )
+
+########## BENCHMARKS ##########
+
+# The hard instance of eight_puzzle_example.py
+EIGHT_PUZZLE = ((8, 7, 6), (0, 4, 1), (2, 5, 3))
+
+# (name, problem generator, generator keyword arguments, planner() keyword
+# arguments); a 'heuristic' given as a callable is built from the problem
+BENCHMARKS = [
+    ('eight_puzzle', n_puzzle, dict(tiles=EIGHT_PUZZLE, compiled=True, static=True),
+     dict(heuristic=manhattan_heuristic)),
+    ('missionaries_cannibals', missionaries_cannibals, dict(compiled=True), dict()),
+    ('butler_story', butler_story, dict(compiled=True), dict()),
+    ('n_puzzle_3x3_hmax', n_puzzle, dict(size=3, moves=16, compiled=True, static=True),
+     dict(heuristic='hmax')),
+    ('n_puzzle_4x4', n_puzzle, dict(size=4, moves=40, compiled=True, static=True),
+     dict(heuristic=manhattan_heuristic)),
+    ('n_puzzle_5x5_gbfs', n_puzzle, dict(size=5, moves=60, compiled=True, static=True),
+     dict(heuristic=manhattan_heuristic, search='gbfs')),
+    ('missionaries_cannibals_5', missionaries_cannibals,
+     dict(missionaries=5, capacity=3, compiled=True), dict()),
+    ('missionaries_cannibals_10', missionaries_cannibals,
+     dict(missionaries=10, capacity=4, compiled=True), dict(heuristic='hadd', search='gbfs')),
+    ('butler_story_6x6', butler_story, dict(characters=6, objects=6, compiled=True),
+     dict(heuristic='hmax')),
+    ('butler_story_12x12', butler_story, dict(characters=12, objects=12, compiled=True, prune=True),
+     dict(heuristic='ff', search='gbfs')),
+]
+
+def run(name, make_problem, problem_kwargs, planner_kwargs):
+    """
+    Runs one benchmark in the current process and returns its
+    results as a dict
+    """
+    problem = make_problem(**problem_kwargs)
+    kwargs = dict(planner_kwargs)
+    if callable(kwargs.get('heuristic')):
+        kwargs['heuristic'] = kwargs['heuristic'](problem)
+    statistics = SearchStatistics()
+    planner(problem, verbose=False, statistics=statistics, **kwargs)
+    result = {
+        'name': name,
+        'grounded_actions': len(problem.grounded_actions),
+        'expansions_per_sec': statistics.expansions_per_sec,
+        'peak_rss_bytes': peak_memory(),
+    }
+    result.update(statistics.as_dict())
+    return result
+
+def _run_child(benchmark, results):
+    try:
+        result = run(*benchmark)
+    except Exception as e:
+        result = {'name': benchmark[0], 'error': repr(e)}
+    results.put(result)
+
+def run_isolated(benchmark, timeout=None):
+    """
+    Runs a BENCHMARKS entry in a forked process, so that its peak memory
+    is its own, and returns its results (with 'timeout' set if it did not
+    finish within timeout seconds, or 'error' if it failed)
+    """
+    context = multiprocessing.get_context('fork')
+    results = context.Queue()
+    process = context.Process(target=_run_child, args=(benchmark, results))
+    process.start()
+    end = None if timeout is None else monotonic() + timeout
+    exited = False
+    try:
+        while True:
+            try:
+                return results.get(timeout=0.1)
+            except queue.Empty:
+                pass
+            if end is not None and monotonic() >= end:
+                return {'name': benchmark[0], 'timeout': timeout}
+            # Read the queue once more after the process exits, for a
+            # result still in the pipe
+            if exited:
+                return {'name': benchmark[0],
+                        'error': f"exited with code {process.exitcode}"}
+            exited = process.exitcode is not None
+    finally:
+        if process.is_alive():
+            process.terminate()
+        process.join()
+
+def main(argv=None):
+    from optparse import OptionParser
+    parser = OptionParser(usage="Usage: %prog [options]")
+    parser.add_option('-k', '--keyword', dest='keyword', default='',
+                      help="only run benchmarks whose name contains KEYWORD")
+    parser.add_option('-o', '--output', dest='output', default=None,
+                      help="write results to OUTPUT instead of stdout")
+    parser.add_option('-t', '--timeout', dest='timeout', type='float', default=None,
+                      help="seconds allowed for each benchmark")
+    opts, args = parser.parse_args(argv)
+
+    out = open(opts.output, 'w') if opts.output else sys.stdout
+    try:
+        for benchmark in BENCHMARKS:
+            if opts.keyword in benchmark[0]:
+                print(json.dumps(run_isolated(benchmark, opts.timeout)), file=out)
+                out.flush()
+    finally:
+        if out is not sys.stdout:
+            out.close()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,194 @@
+"""
+On-disk cache of grounded and compiled actions.
+
+Grounding a domain is keyed by a SHA-256 hash of the content of its action
+schemas and objects (and of init, for groundings that depend on it). A
+cache file holds a magic header followed by a marshal payload: a table of
+the distinct grounded predicates and effects, each stored once, per
+action its name, signature, the table indices of its preconditions and
+effects and its compiled bitmasks, the atoms of the compiled Task in id
+order, and the nodes of the SuccessorGenerator decision tree. Atom ids
+do not depend on init (the Task interns the atoms of the actions first),
+so loading rebuilds the Task and tree as they were, without substituting
+parameters, encoding bitmasks or sorting actions into the tree again.
+
+The file name also holds the format version, and a file that cannot be
+loaded is treated as a miss: the domain is grounded again and the file
+replaced.
+
+Loading unmarshals private copies of everything; processes forked after
+loading share them through copy-on-write pages, as for any Problem.
+"""
+import hashlib
+import marshal
+import os
+import tempfile
+from .pyddl import _GroundedAction
+from .task import Task
+from .successors import _Node, SuccessorGenerator
+
+MAGIC = b'PYDDLGA2'
+
+def grounding_key(domain, objects, init=None, prune=False, static=False):
+    """
+    Returns the hex digest identifying the grounding of the domain
+    with the objects (and init, if prune or static)
+    """
+    content = list()
+    for action in domain.actions:
+        content.append((action.name, action.types, action.arg_names,
+                        tuple(action.preconditions), tuple(action.effects),
+                        action.unique, action.no_permute))
+    content.append(sorted((repr(t), tuple(objects[t])) for t in objects))
+    if prune or static:
+        content.append((prune, static, sorted(map(repr, init))))
+    return hashlib.sha256(repr(content).encode('utf-8')).hexdigest()
+
+def write_atomic(path, magic, payload):
+    """Writes a magic header and a payload to a file, replacing it atomically"""
+    directory = os.path.dirname(path) or '.'
+    fd, tmp = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(magic)
+            f.write(payload)
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+
+def read_marshal(path, magic):
+    """Returns the marshal payload of a file written by write_atomic()"""
+    with open(path, 'rb') as f:
+        data = f.read()
+    if data[:len(magic)] != magic:
+        raise Exception(f"Invalid cache file : {path}")
+    return marshal.loads(memoryview(data)[len(magic):])
+
+def save_grounding(path, problem):
+    """
+    Writes the grounded actions of a problem to a cache file, replacing it
+    atomically, with the atoms of its compiled Task, the bitmasks of the
+    compiled actions and the decision tree of its SuccessorGenerator
+    """
+    task = problem.compile()
+    successors = problem.successor_generator()
+    terms = list()
+    term_ids = dict()
+    def _id(term):
+        i = term_ids.get(term)
+        if i is None:
+            i = term_ids[term] = len(terms)
+            terms.append(term)
+        return i
+    actions = list()
+    for action in problem.grounded_actions:
+        # Atoms of the precomputed sets, unless numeric parts (closures)
+        # must be precomputed again
+        split = None
+        if not action.num_preconditions and not action.num_effects:
+            split = [[_id(atom) for atom in part]
+                     for part in (action.pos_preconditions, action.neg_preconditions,
+                                   action.add_effects, action.del_effects)]
+        actions.append((action.name, action.sig,
+                        [_id(pre) for pre in action.preconditions],
+                        [_id(effect) for effect in action.effects],
+                        split, action.compiled[:4]))
+    atoms = [_id(atom) for atom in task.atoms]
+
+    # Nodes of the tree, parents first, as (atom id tested, index of the
+    # true and dont_care subtrees, indices of actions and checked actions)
+    nodes = list()
+    order = [successors.root]
+    for node in order:
+        key = node.key
+        if key is not None:
+            key = task.atom_ids[key] if successors.task is None else key.bit_length() - 1
+        children = list()
+        for child in (node.true, node.dont_care):
+            if child is None:
+                children.append(None)
+            else:
+                children.append(len(order))
+                order.append(child)
+        nodes.append((key, children[0], children[1],
+                      [action.index for action in node.actions],
+                      [action.index for action in node.checked]))
+    write_atomic(path, MAGIC, marshal.dumps((terms, actions, atoms, nodes)))
+
+def load_grounding(path):
+    """
+    Returns (grounded_actions, atoms, nodes) stored in a cache file: the
+    grounded actions, their bitmasks set in action.compiled, and the
+    atoms and tree nodes to pass to restore() with the Problem
+    """
+    terms, actions, atoms, nodes = read_marshal(path, MAGIC)
+    grounded_actions = list()
+    for index, (name, sig, preconditions, effects, split, masks) in enumerate(actions):
+        action = _GroundedAction.__new__(_GroundedAction)
+        action.name = name
+        action.sig = sig
+        action.index = index
+        action.preconditions = [terms[i] for i in preconditions]
+        action.effects = [terms[i] for i in effects]
+        if split is None:
+            action.precompute()
+        else:
+            action.pos_preconditions, action.neg_preconditions, \
+                action.add_effects, action.del_effects = \
+                [frozenset([terms[i] for i in part]) for part in split]
+            action.num_preconditions = ()
+            action.num_effects = ()
+        action.compiled = tuple(masks) + ((), None)
+        grounded_actions.append(action)
+    return grounded_actions, [terms[i] for i in atoms], nodes
+
+def restore(problem, atoms, nodes):
+    """
+    Sets the compiled Task and SuccessorGenerator of a Problem whose
+    grounded actions were returned by load_grounding()
+    """
+    task = Task(problem, atoms)
+    actions = problem.grounded_actions
+    successors = SuccessorGenerator.__new__(SuccessorGenerator)
+    successors.task = task if problem.compiled else None
+    tree = [_Node.__new__(_Node) for _ in nodes]
+    for node, (key, true, dont_care, node_actions, checked) in zip(tree, nodes):
+        if key is not None:
+            key = 1 << key if problem.compiled else task.atoms[key]
+        node.key = key
+        node.true = None if true is None else tree[true]
+        node.dont_care = None if dont_care is None else tree[dont_care]
+        node.actions = [actions[i] for i in node_actions]
+        node.checked = [actions[i] for i in checked]
+    successors.root = tree[0]
+    problem._task = task
+    problem._successors = successors
+
+def cached_grounding(cache_dir, domain, objects, init=None, prune=False, static=False):
+    """
+    Returns (grounded_actions, finish): domain.ground(objects, ...) (see
+    Domain.ground), loaded from cache_dir if it was stored there, and a
+    function to call with the Problem once it is set up, which restores
+    its Task and SuccessorGenerator from the cache, or builds them and
+    stores everything there
+    """
+    key = grounding_key(domain, objects, init, prune, static)
+    # Files of other formats are named differently, so are not loaded
+    path = os.path.join(cache_dir, f"{key}.{MAGIC.decode('ascii').lower()}")
+    if os.path.exists(path):
+        try:
+            grounded_actions, atoms, nodes = load_grounding(path)
+        except Exception:
+            # Invalid or truncated file: ground again and replace it
+            pass
+        else:
+            return grounded_actions, lambda problem: restore(problem, atoms, nodes)
+    if prune or static:
+        grounded_actions = domain.ground(objects, init, prune, static)
+    else:
+        grounded_actions = domain.ground(objects)
+    def _store(problem):
+        os.makedirs(cache_dir, exist_ok=True)
+        save_grounding(path, problem)
+    return grounded_actions, _store
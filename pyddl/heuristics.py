@@ -0,0 +1,249 @@
+"""
+Heuristics computed on the delete relaxation of a grounded Problem.
+
+Relaxed costs are found in a single generalized Dijkstra pass over the
+precomputed positive preconditions and add effects of the grounded actions;
+negative and numeric conditions are ignored by the relaxation.
+"""
+import heapq
+from collections import OrderedDict
+from .pyddl import NUM_OPS
+from .hooks import SearchHooks
+
+INF = float('inf')
+
+class RelaxedHeuristic(object):
+    """
+    h_max (combine=max) or h_add (combine=sum) heuristic,
+    with unit action costs
+    """
+
+    def __init__(self, problem, combine=sum):
+        """
+        @arg problem : a pyddl Problem
+        @arg combine : max or sum, how costs of several atoms are combined
+        """
+        task = problem.compile()
+        self.task = task
+        self.actions = problem.grounded_actions
+        self.combine = combine
+        self.preconditions = [[task.intern(atom) for atom in action.pos_preconditions]
+                              for action in self.actions]
+        self.add_effects = [[task.intern(atom) for atom in action.add_effects]
+                            for action in self.actions]
+        self.goal = sorted(set(task.intern(g) for g in problem.goal
+                               if g[0] not in NUM_OPS and g[0] != -1))
+
+        self.num_atoms = len(task.atoms)
+        self.precondition_of = [list() for _ in range(self.num_atoms)]
+        for a, pre in enumerate(self.preconditions):
+            for p in pre:
+                self.precondition_of[p].append(a)
+        self.no_preconditions = [a for a, pre in enumerate(self.preconditions) if not pre]
+        self.is_goal = [False] * self.num_atoms
+        for g in self.goal:
+            self.is_goal[g] = True
+
+        # Results of the last evaluation
+        self.cost = None
+        self.supporter = None
+
+    def _atoms(self, state):
+        """Returns the ids of the atoms true in a State or PackedState"""
+        bits = getattr(state, 'bits', None)
+        if bits is None:
+            atom_ids = self.task.atom_ids
+            return [atom_ids[p] for p in state.predicates
+                    if atom_ids.get(p, self.num_atoms) < self.num_atoms]
+        # Atoms interned after this heuristic was built (such as the init
+        # of a Problem variant) appear in no action, so can be ignored
+        bits &= (1 << self.num_atoms) - 1
+        atoms = list()
+        while bits:
+            low = bits & -bits
+            atoms.append(low.bit_length() - 1)
+            bits ^= low
+        return atoms
+
+    def _explore(self, state, complete=False):
+        """
+        Computes relaxed atom costs from the state until all goal atoms
+        are reached (or all reachable atoms, if complete); returns the
+        combined cost of the goal
+        """
+        cost = [INF] * self.num_atoms
+        supporter = [None] * self.num_atoms
+        unsatisfied = [len(pre) for pre in self.preconditions]
+        action_cost = [0] * len(self.actions)
+        add_effects = self.add_effects
+        precondition_of = self.precondition_of
+        is_goal = self.is_goal
+        use_max = self.combine is max
+
+        queue = list()
+        for p in self._atoms(state):
+            cost[p] = 0
+            queue.append((0, p))
+        for a in self.no_preconditions:
+            for q in add_effects[a]:
+                if 1 < cost[q]:
+                    cost[q] = 1
+                    supporter[q] = a
+                    queue.append((1, q))
+        heapq.heapify(queue)
+
+        goals_left = len(self.goal)
+        while queue and (goals_left or complete):
+            c, p = heapq.heappop(queue)
+            if c > cost[p]:
+                continue
+            if is_goal[p]:
+                goals_left -= 1
+            for a in precondition_of[p]:
+                unsatisfied[a] -= 1
+                if use_max:
+                    if c > action_cost[a]:
+                        action_cost[a] = c
+                else:
+                    action_cost[a] += c
+                if unsatisfied[a] == 0:
+                    c_next = action_cost[a] + 1
+                    for q in add_effects[a]:
+                        if c_next < cost[q]:
+                            cost[q] = c_next
+                            supporter[q] = a
+                            heapq.heappush(queue, (c_next, q))
+
+        self.cost = cost
+        self.supporter = supporter
+        if goals_left:
+            return INF
+        return self.combine([cost[g] for g in self.goal]) if self.goal else 0
+
+    def __call__(self, state):
+        return self._explore(state)
+
+    def atom_costs(self, state):
+        """
+        Returns the list of the relaxed costs of all atoms from the state,
+        indexed by atom id (INF for unreachable atoms)
+        """
+        self._explore(state, complete=True)
+        return self.cost
+
+class FFHeuristic(RelaxedHeuristic):
+    """
+    FF heuristic: the length of a relaxed plan extracted from the
+    best supporters of h_add
+    """
+
+    def __init__(self, problem, preferred=False):
+        """
+        @arg problem : a pyddl Problem
+        @arg preferred : if True, after each evaluation, self.preferred
+                         holds the actions of the relaxed plan applicable
+                         in the state (preferred operators; no search of
+                         planner() uses them)
+        """
+        super(FFHeuristic, self).__init__(problem, sum)
+        self.find_preferred = preferred
+        self.preferred = list()
+
+    def __call__(self, state):
+        if self.find_preferred:
+            self.preferred = list()
+        if self._explore(state) == INF:
+            return INF
+        cost = self.cost
+        supporter = self.supporter
+        relaxed_plan = set()
+        marked = set()
+        stack = [g for g in self.goal if cost[g] > 0]
+        while stack:
+            p = stack.pop()
+            if p in marked:
+                continue
+            marked.add(p)
+            a = supporter[p]
+            if a not in relaxed_plan:
+                relaxed_plan.add(a)
+                stack.extend(q for q in self.preconditions[a] if cost[q] > 0)
+        if not self.find_preferred:
+            return len(relaxed_plan)
+        for a in sorted(relaxed_plan):
+            if all(cost[q] == 0 for q in self.preconditions[a]) and \
+                    state.is_applicable(self.actions[a]):
+                self.preferred.append(self.actions[a])
+        return len(relaxed_plan)
+
+def hmax_heuristic(problem):
+    """Admissible h_max heuristic on the delete relaxation"""
+    return RelaxedHeuristic(problem, max)
+
+def hadd_heuristic(problem):
+    """Inadmissible h_add heuristic on the delete relaxation"""
+    return RelaxedHeuristic(problem, sum)
+
+def ff_heuristic(problem):
+    """Inadmissible FF (relaxed plan) heuristic"""
+    return FFHeuristic(problem)
+
+# Heuristics that can be selected by name in planner()
+HEURISTICS = {
+    'hmax': hmax_heuristic,
+    'hadd': hadd_heuristic,
+    'ff': ff_heuristic,
+}
+
+class HeuristicCache(object):
+    """
+    Memoizes a heuristic h(state) on state.key, evicting the least
+    recently used values once maxsize of them are stored
+    """
+
+    def __init__(self, heuristic, maxsize=2**16):
+        """
+        @arg heuristic : the h(state) callable to wrap
+        @arg maxsize : maximum number of cached values (None for unbounded)
+        """
+        self.heuristic = heuristic
+        self.maxsize = maxsize
+        self.values = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __call__(self, state):
+        key = state.key
+        values = self.values
+        value = values.get(key)
+        if value is not None:
+            self.hits += 1
+            values.move_to_end(key)
+            return value
+        self.misses += 1
+        value = values[key] = self.heuristic(state)
+        if self.maxsize is not None and len(values) > self.maxsize:
+            values.popitem(last=False)
+        return value
+
+    def __len__(self):
+        return len(self.values)
+
+    def clear(self):
+        self.values.clear()
+        self.hits = 0
+        self.misses = 0
+
+def cached_heuristic(problem, heuristic, maxsize=2**16):
+    """
+    Returns the HeuristicCache for the heuristic (a callable or a name
+    from HEURISTICS) shared by all searches on the problem
+    """
+    cache = problem.heuristic_caches.get(heuristic)
+    if cache is None:
+        h = HEURISTICS[heuristic](problem) if isinstance(heuristic, str) else heuristic
+        if isinstance(h, SearchHooks):
+            # Such as LandmarkCountHeuristic, whose values depend on the path
+            raise Exception("Heuristics following paths cannot be cached")
+        cache = problem.heuristic_caches[heuristic] = HeuristicCache(h, maxsize)
+    return cache
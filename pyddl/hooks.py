@@ -0,0 +1,134 @@
+"""
+Instrumentation hooks for planner().
+
+A search calls the functions doing its work (finding applicable actions,
+applying them, testing the goal, evaluating the heuristic) through locals
+set up once by instrument(). Without hooks, or for methods a SearchHooks
+subclass does not override, these are the plain functions and the hooks
+are None, so unused instrumentation costs nothing per state.
+"""
+from time import perf_counter
+
+# Phases of a search timed by SearchHooks.on_phase
+PHASES = ('successors', 'apply', 'goal', 'heuristic')
+
+class SearchHooks(object):
+    """
+    Base class of planner() hooks: subclasses override the methods they
+    need, and the others are never called
+    """
+
+    def on_start(self, state0):
+        """Called before a search starts, with its initial state"""
+
+    def on_expand(self, state, g):
+        """Called when a state is expanded, with its path cost"""
+
+    def on_generate(self, state, action, successor):
+        """Called when applying action to state generates successor"""
+
+    def on_goal(self, state, plan):
+        """Called when a goal state is expanded, with the plan reaching it"""
+
+    def on_phase(self, phase, seconds, action=None):
+        """
+        Called with the duration of each step of a phase of the search
+        (see PHASES), and the action applied for 'apply'
+        """
+
+def _hook(hooks, name):
+    """
+    Returns the bound hook method if overridden, else None; for a list of
+    hooks, a function calling the overridden methods of each in turn
+    """
+    if isinstance(hooks, (list, tuple)):
+        methods = [method for method in (_hook(h, name) for h in hooks)
+                   if method is not None]
+        if len(methods) < 2:
+            return methods[0] if methods else None
+        def chained(*args):
+            for method in methods:
+                method(*args)
+        return chained
+    if hooks is None or getattr(type(hooks), name) is getattr(SearchHooks, name):
+        return None
+    return getattr(hooks, name)
+
+def _timed(function, phase, on_phase):
+    def timed(*args):
+        start = perf_counter()
+        result = function(*args)
+        on_phase(phase, perf_counter() - start)
+        return result
+    return timed
+
+def _timed_apply(function, on_phase):
+    def timed(state, action, monotone):
+        start = perf_counter()
+        result = function(state, action, monotone)
+        on_phase('apply', perf_counter() - start, action)
+        return result
+    return timed
+
+def instrument(hooks, problem, state0, heuristic):
+    """
+    Returns (on_expand, on_generate, on_goal, applicable, successor,
+    is_applicable, heuristic): the hooks a search calls (None if unused;
+    hooks may be a SearchHooks or a list of them),
+    and the functions it calls to get the actions applicable in a state,
+    apply an action to a state, test a goal and evaluate the heuristic,
+    timed if hooks override on_phase; calls on_start of the hooks, as
+    the search is about to start
+    """
+    applicable = problem.successor_generator().applicable
+    successor = type(state0).successor
+    is_applicable = type(state0).is_applicable
+    on_phase = _hook(hooks, 'on_phase')
+    if on_phase is not None:
+        applicable = _timed(applicable, 'successors', on_phase)
+        successor = _timed_apply(successor, on_phase)
+        is_applicable = _timed(is_applicable, 'goal', on_phase)
+        heuristic = _timed(heuristic, 'heuristic', on_phase)
+    on_start = _hook(hooks, 'on_start')
+    if on_start is not None:
+        on_start(state0)
+    return (_hook(hooks, 'on_expand'), _hook(hooks, 'on_generate'), _hook(hooks, 'on_goal'),
+            applicable, successor, is_applicable, heuristic)
+
+class ActionProfiler(SearchHooks):
+    """
+    Hooks aggregating, per action schema, the number of successors
+    generated by its grounded actions and the time spent applying them,
+    and the total time spent in each phase of the search
+    """
+
+    def __init__(self):
+        self.expanded = 0
+        self.counts = dict()
+        self.times = dict()
+        self.phases = {phase: 0.0 for phase in PHASES}
+
+    def on_expand(self, state, g):
+        self.expanded += 1
+
+    def on_generate(self, state, action, successor):
+        self.counts[action.name] = self.counts.get(action.name, 0) + 1
+
+    def on_phase(self, phase, seconds, action=None):
+        self.phases[phase] += seconds
+        if action is not None:
+            self.times[action.name] = self.times.get(action.name, 0.0) + seconds
+
+    def report(self):
+        """Returns (schema, successors, seconds) tuples, most time first"""
+        return sorted(((name, self.counts.get(name, 0), self.times.get(name, 0.0))
+                       for name in set(self.counts) | set(self.times)),
+                      key=lambda row: -row[2])
+
+    def __str__(self):
+        lines = ['%-24s %10s %10s' % ('schema', 'successors', 'ms')]
+        for name, count, seconds in self.report():
+            lines.append('%-24s %10d %10.3f' % (name, count, 1000 * seconds))
+        for phase in PHASES:
+            lines.append('%-24s %10s %10.3f' % (phase, '', 1000 * self.phases[phase]))
+        return '\n'.join(lines)
@@ -0,0 +1,256 @@
+"""
+Landmarks and the landmark-count heuristic.
+
+A landmark is an atom true at some point of every plan. The goal atoms
+are landmarks, and backchaining from each landmark L (not true in init)
+finds more: its possible first achievers are the actions adding L whose
+preconditions can be reached in the delete relaxation without achieving
+L, and the atoms they all require are landmarks that must hold before L
+(a greedy-necessary ordering). If L has no possible first achiever, no
+plan exists.
+
+The landmark-count heuristic counts the landmarks still to achieve: those
+not accepted yet on the path to a state, plus accepted ones that must be
+achieved again (false goals, and false landmarks ordered before one not
+accepted yet). A landmark is accepted when it becomes true after all the
+landmarks ordered before it were accepted. Accepted landmarks are tracked
+per state as a bitmask, updated from the parent's with the atoms each
+action adds, so the heuristic is also a SearchHooks; a state reached by
+several paths keeps the landmarks accepted on all of them.
+
+Landmarks alone do not see that a story is stuck (once the lord drinks
+unpoisoned wine, the wine can no longer be poisoned), so by default the
+landmarks still to achieve are also checked to be reachable in the delete
+relaxation.
+"""
+from .heuristics import RelaxedHeuristic, HEURISTICS, INF
+from .hooks import SearchHooks
+
+def _bit_count(bits):
+    return bin(bits).count('1')
+
+class Landmarks(object):
+
+    def __init__(self, problem):
+        """
+        Finds the landmarks of a problem and their orderings
+        @arg problem : a pyddl Problem
+        """
+        relaxed = RelaxedHeuristic(problem)
+        self.relaxed = relaxed
+        self.task = relaxed.task
+        self.achievers = [list() for _ in range(relaxed.num_atoms)]
+        for a, add in enumerate(relaxed.add_effects):
+            for p in add:
+                self.achievers[p].append(a)
+        self.init = set(relaxed._atoms(problem.initial_state()))
+
+        # Landmark atoms, the index of each, and the (before, after)
+        # pairs of indices of greedy-necessary orderings
+        self.atoms = list()
+        self.index = dict()
+        self.orderings = list()
+        self.unsolvable = False
+        queue = list()
+        for g in relaxed.goal:
+            self._add(g, queue)
+        while queue:
+            landmark = queue.pop(0)
+            if landmark in self.init:
+                continue
+            reachable = self._reachable(landmark)
+            first_achievers = [a for a in self.achievers[landmark]
+                               if all(reachable[p] for p in relaxed.preconditions[a])]
+            if not first_achievers:
+                self.unsolvable = True
+                continue
+            shared = set(relaxed.preconditions[first_achievers[0]])
+            for a in first_achievers[1:]:
+                shared.intersection_update(relaxed.preconditions[a])
+            for p in sorted(shared):
+                self.orderings.append((self._add(p, queue), self.index[landmark]))
+
+        self.goal = 0
+        for g in relaxed.goal:
+            self.goal |= 1 << self.index[g]
+        # Bitmasks of the landmarks ordered before and after each
+        self.before = [0] * len(self.atoms)
+        self.after = [0] * len(self.atoms)
+        for before, after in set(self.orderings):
+            self.before[after] |= 1 << before
+            self.after[before] |= 1 << after
+
+    def _add(self, atom, queue):
+        """Returns the index of a landmark atom, adding it if new"""
+        i = self.index.get(atom)
+        if i is None:
+            i = self.index[atom] = len(self.atoms)
+            self.atoms.append(atom)
+            queue.append(atom)
+        return i
+
+    def _reachable(self, excluded=None, atoms=None, targets=None):
+        """
+        Returns, by atom id, whether the atom is reachable in the delete
+        relaxation from atoms (init by default) without the actions adding
+        excluded; stops early once all atoms in targets are reachable
+        """
+        relaxed = self.relaxed
+        reachable = [False] * relaxed.num_atoms
+        unsatisfied = [len(pre) for pre in relaxed.preconditions]
+        stack = list()
+        for p in (self.init if atoms is None else atoms):
+            reachable[p] = True
+            stack.append(p)
+        left = None if targets is None else set(targets).difference(stack)
+        ready = list(relaxed.no_preconditions)
+        while (stack or ready) and left != set():
+            while ready:
+                a = ready.pop()
+                if excluded in relaxed.add_effects[a]:
+                    continue
+                for q in relaxed.add_effects[a]:
+                    if not reachable[q]:
+                        reachable[q] = True
+                        stack.append(q)
+                        if left:
+                            left.discard(q)
+            if stack:
+                p = stack.pop()
+                for a in relaxed.precondition_of[p]:
+                    unsatisfied[a] -= 1
+                    if unsatisfied[a] == 0:
+                        ready.append(a)
+        return reachable
+
+    def __len__(self):
+        return len(self.atoms)
+
+    def reachable(self, state, landmarks):
+        """
+        Checks whether all landmarks of a bitmask are reachable from a State
+        or PackedState in the delete relaxation
+        """
+        targets = list()
+        while landmarks:
+            low = landmarks & -landmarks
+            targets.append(self.atoms[low.bit_length() - 1])
+            landmarks ^= low
+        reachable = self._reachable(atoms=self.relaxed._atoms(state), targets=targets)
+        return all(reachable[p] for p in targets)
+
+    def true(self, state):
+        """Returns the bitmask of the landmarks true in a State or PackedState"""
+        index = self.index
+        bits = 0
+        for p in self.relaxed._atoms(state):
+            i = index.get(p)
+            if i is not None:
+                bits |= 1 << i
+        return bits
+
+class LandmarkCountHeuristic(SearchHooks):
+    """
+    Inadmissible landmark-count heuristic; planner() also calls it as
+    hooks (with any others given), to track accepted landmarks along paths.
+    The accepted landmarks of the states of a search are kept until the
+    next search with the heuristic starts, or clear() is called
+    """
+
+    def __init__(self, problem, landmarks=None, dead_ends=True):
+        """
+        @arg problem : a pyddl Problem
+        @arg landmarks : the Landmarks of the problem (found by default)
+        @arg dead_ends : if True, states from which a landmark still to
+                         achieve is unreachable in the delete relaxation
+                         are dead ends (h = INF); this costs a relaxed
+                         exploration per evaluation, and can be turned off
+                         for domains without dead ends
+        """
+        if landmarks is None:
+            landmarks = Landmarks(problem)
+        self.landmarks = landmarks
+        self.dead_ends = dead_ends
+        # Landmark index of each landmark atom id, and their bitmask
+        self.atom_index = [None] * landmarks.relaxed.num_atoms
+        self.mask = 0
+        for i, atom in enumerate(landmarks.atoms):
+            self.atom_index[atom] = i
+            self.mask |= 1 << atom
+        self.all = (1 << len(landmarks)) - 1
+        # Accepted landmarks of the states generated so far
+        self.accepted = dict()
+
+    def clear(self):
+        """Forgets the accepted landmarks of the states generated so far"""
+        self.accepted = dict()
+
+    def on_start(self, state0):
+        self.clear()
+
+    def _accepted(self, state):
+        """
+        Returns the landmarks accepted in a state, taken to be those true
+        in it for a state not generated by the search (such as state0)
+        """
+        accepted = self.accepted.get(state)
+        if accepted is None:
+            accepted = self.accepted[state] = self.landmarks.true(state)
+        return accepted
+
+    def _added(self, state, successor):
+        """Yields the indices of the landmarks made true in successor"""
+        bits = getattr(successor, 'bits', None)
+        if bits is None:
+            atom_ids = self.landmarks.task.atom_ids
+            index = self.landmarks.index
+            for p in successor.predicates - state.predicates:
+                i = index.get(atom_ids.get(p))
+                if i is not None:
+                    yield i
+            return
+        bits &= ~state.bits & self.mask
+        while bits:
+            low = bits & -bits
+            i = self.atom_index[low.bit_length() - 1]
+            if i is not None:
+                yield i
+            bits ^= low
+
+    def on_generate(self, state, action, successor):
+        parent = self._accepted(state)
+        accepted = parent
+        before = self.landmarks.before
+        for i in self._added(state, successor):
+            if not before[i] & ~parent:
+                accepted |= 1 << i
+        known = self.accepted.get(successor)
+        self.accepted[successor] = accepted if known is None else known & accepted
+
+    def __call__(self, state):
+        landmarks = self.landmarks
+        if landmarks.unsolvable:
+            return INF
+        accepted = self._accepted(state)
+        unaccepted = self.all & ~accepted
+        # Accepted landmarks false in the state and needed again
+        false = accepted & ~landmarks.true(state)
+        required = false & landmarks.goal
+        after = landmarks.after
+        bits = false & ~required
+        while bits:
+            low = bits & -bits
+            if after[low.bit_length() - 1] & unaccepted:
+                required |= low
+            bits ^= low
+        if self.dead_ends and (unaccepted or required) and \
+                not landmarks.reachable(state, unaccepted | required):
+            return INF
+        return _bit_count(unaccepted) + _bit_count(required)
+
+def lmcount_heuristic(problem):
+    """Inadmissible landmark-count heuristic (see LandmarkCountHeuristic)"""
+    return LandmarkCountHeuristic(problem)
+
+# Selectable by name in planner() like the relaxed heuristics
+HEURISTICS['lmcount'] = lmcount_heuristic
@@ -0,0 +1,450 @@
+"""
+Hash-distributed A* (HDA*) over several processes.
+
+Every state is owned by the worker process given by its hash modulo the
+number of workers. Each worker runs A* on the states it owns, with its own
+NodeTable and open list, and sends the successors owned by other workers
+to their inboxes; the heuristic is evaluated by the owner. Workers keep
+expanding until no state can improve on the best plan found, so the plan
+is as good as the one found by planner().
+
+Workers are forked, so that the Problem and heuristic (which hold
+closures) are inherited rather than pickled; only states, path costs and
+back-pointers (owner, node index, action index) travel through the
+queues. Once the search ends, the coordinator rebuilds the plan by asking
+the owner of each node on it for its back-pointer. This needs the 'fork'
+start method, available on POSIX systems.
+"""
+import multiprocessing
+import os
+import pickle
+import queue
+import signal
+import time
+import traceback
+from time import perf_counter
+from .pyddl import State
+from .search import NodeTable, HeapOpenList
+
+# Number of nodes a worker expands between checks of its inbox
+BATCH = 64
+
+def _pack(state):
+    """Picklable form of a State or PackedState, without its Task"""
+    if isinstance(state, State):
+        return state.predicates
+    return (state.bits, state.fluents, state.zobrist)
+
+def _unpack(state0, packed):
+    """Rebuilds a state packed by _pack, of the same type as state0"""
+    if isinstance(state0, State):
+        return State(packed)
+    return type(state0)(state0.task, packed[0], packed[1], zobrist=packed[2])
+
+class _Shared(object):
+    """Values shared by the coordinator and the workers"""
+
+    def __init__(self, context, workers):
+        self.stop = context.Event()
+        self.incumbent = context.Value('d', float('inf'))
+        self.idle = context.Array('b', [1] * workers)
+        self.sent = context.Value('q', 0)
+        self.received = context.Value('q', 0)
+        self.inboxes = [context.Queue() for _ in range(workers)]
+        self.results = context.Queue()
+
+    def send(self, owner, batch):
+        # Count before sending, so that a message is never in flight
+        # while sent == received
+        with self.sent.get_lock():
+            self.sent.value += 1
+        self.inboxes[owner].put(batch)
+
+    def counters(self):
+        return self.sent.value, self.received.value
+
+def _worker(index, problem, heuristic, state0, goal, monotone, shared):
+    """
+    Runs _search(), sending back an error (the exception itself if it can
+    be pickled) and stopping the other workers if it raises; otherwise
+    answers requests for the back-pointers of its nodes until told to exit
+    """
+    for inbox in shared.inboxes:
+        inbox.cancel_join_thread()
+    parent = os.getppid()
+    try:
+        parents = _search(index, problem, heuristic, state0, goal, monotone, shared)
+    except BaseException as e:
+        try:
+            pickle.dumps(e)
+        except Exception:
+            e = Exception(traceback.format_exc())
+        shared.results.put(('error', index, e))
+        shared.stop.set()
+        return
+    inbox = shared.inboxes[index]
+    while True:
+        try:
+            message = inbox.get(timeout=1)
+        except queue.Empty:
+            # The coordinator died without telling workers to exit
+            if os.getppid() != parent:
+                return
+            continue
+        if message is None:
+            return
+        # Batches of states still in flight are dropped
+        if isinstance(message, tuple):
+            shared.results.put(('trace', parents[message[1]]))
+
+def _search(index, problem, heuristic, state0, goal, monotone, shared):
+    """
+    A* on the states owned by worker index; see hda_star(). Returns the
+    back-pointers (owner, node index, action index) of its nodes, None
+    for state0
+    """
+    inbox = shared.inboxes[index]
+    workers = len(shared.inboxes)
+    successor_generator = problem.successor_generator()
+
+    table = NodeTable()
+    parents = list()
+    fringe = HeapOpenList()
+    # Counters of SearchStatistics, sent to the coordinator at the end
+    counters = dict(expanded=0, generated=0, duplicates=0, reopened=0,
+                    peak_open=0, evaluations=0, heuristic_time=0.0)
+
+    def _insert(state, g, parent):
+        # States arrive out of global f order, so a closed node may be
+        # reached again by a cheaper path and must then be reopened
+        i = table.ids.get(state)
+        if i is not None and table.closed[i] and g < table.g[i]:
+            table.closed[i] = 0
+            counters['reopened'] += 1
+        i, improved = table.insert(state, g)
+        if i == len(parents):
+            parents.append(parent)
+        elif improved:
+            parents[i] = parent
+        if not improved:
+            counters['duplicates'] += 1
+            return
+        t = perf_counter()
+        h = heuristic(state)
+        counters['heuristic_time'] += perf_counter() - t
+        counters['evaluations'] += 1
+        if g + h < shared.incumbent.value:
+            fringe.push(g + h, g, h, (i, g, g + h))
+
+    while not shared.stop.is_set():
+        # Receive states from other workers, waiting a little if idle
+        while True:
+            try:
+                batch = inbox.get(timeout=0.01) if not len(fringe) else inbox.get_nowait()
+            except queue.Empty:
+                break
+            shared.idle[index] = 0
+            with shared.received.get_lock():
+                shared.received.value += 1
+            for packed, g, parent in batch:
+                _insert(_unpack(state0, packed), g, parent)
+
+        outgoing = [list() for _ in range(workers)]
+        if len(fringe) > counters['peak_open']:
+            counters['peak_open'] = len(fringe)
+        for _ in range(BATCH):
+            if not len(fringe):
+                break
+            i, g, f = fringe.pop()
+            if table.closed[i] or g != table.g[i]:
+                continue
+            table.closed[i] = 1
+            # The incumbent may have improved since the node was pushed
+            if f >= shared.incumbent.value:
+                continue
+            counters['expanded'] += 1
+            state = table.states[i]
+
+            if state.is_applicable(goal):
+                with shared.incumbent.get_lock():
+                    if g < shared.incumbent.value:
+                        shared.incumbent.value = g
+                        shared.results.put(('plan', g, (index, i)))
+                continue
+
+            for action in successor_generator.applicable(state):
+                successor = state.successor(action, monotone)
+                counters['generated'] += 1
+                parent = (index, i, action.index)
+                owner = hash(successor) % workers
+                if owner == index:
+                    _insert(successor, g + 1, parent)
+                else:
+                    outgoing[owner].append((_pack(successor), g + 1, parent))
+
+        for owner, batch in enumerate(outgoing):
+            if batch:
+                shared.send(owner, batch)
+        if not len(fringe):
+            shared.idle[index] = 1
+
+    counters['peak_closed'] = sum(table.closed)
+    shared.results.put(('statistics', index, counters))
+    return parents
+
+def _trace(shared, processes, node):
+    """
+    Returns the action indices of the path to node (owner, node index),
+    following back-pointers by asking their owners
+    """
+    path = list()
+    while True:
+        owner, i = node
+        shared.inboxes[owner].put(('trace', i))
+        while True:
+            try:
+                _, parent = shared.results.get(timeout=0.1)
+                break
+            except queue.Empty:
+                if processes[owner].exitcode is not None:
+                    raise Exception(f"HDA* worker {owner} exited while tracing the plan")
+        if parent is None:
+            break
+        path.append(parent[2])
+        node = parent[:2]
+    path.reverse()
+    return path
+
+def hda_star(problem, heuristic, state0, goal, monotone=False, workers=None,
+             statistics=None, deadline=None):
+    """
+    Runs HDA* with the given number of worker processes (one per CPU by
+    default) and returns the plan found, or None if there is none or the
+    deadline (in seconds) passes first; see planner() for the other
+    arguments, with goal a grounded pseudo-action. The counters of the
+    workers are added up in statistics, if given (peak sizes are the sums
+    of the peaks of the workers)
+    """
+    if workers is None:
+        workers = os.cpu_count() or 1
+    end = None if deadline is None else time.time() + deadline
+    context = multiprocessing.get_context('fork')
+    shared = _Shared(context, workers)
+    processes = [context.Process(target=_worker,
+                                 args=(i, problem, heuristic, state0, goal, monotone, shared))
+                 for i in range(workers)]
+    for process in processes:
+        process.daemon = True
+        process.start()
+
+    try:
+        shared.send(hash(state0) % workers, [(_pack(state0), 0, None)])
+
+        # Terminate once every worker is idle and no message is in flight,
+        # with the message counters unchanged while checking the workers
+        exhausted = None
+        while True:
+            time.sleep(0.005)
+            if end is not None and time.time() >= end:
+                exhausted = 'deadline'
+                break
+            # A worker failed (and posted its error), or died
+            if shared.stop.is_set() or any(process.exitcode is not None for process in processes):
+                break
+            before = shared.counters()
+            if before[0] != before[1] or not all(shared.idle):
+                continue
+            if shared.counters() == before:
+                break
+        shared.stop.set()
+
+        # Each worker sends its plans, then its counters (or its error) as
+        # it stops; once a worker has exited without reporting, the queue
+        # is read once more for messages still in the pipe
+        best = None
+        totals = dict()
+        errors = list()
+        reported = set()
+        finished = False
+        while len(reported) < workers:
+            try:
+                message = shared.results.get(timeout=0.1)
+            except queue.Empty:
+                if finished:
+                    break
+                finished = any(process.exitcode is not None and k not in reported
+                               for k, process in enumerate(processes))
+                continue
+            if message[0] == 'statistics':
+                reported.add(message[1])
+                for field, value in message[2].items():
+                    totals[field] = totals.get(field, 0) + value
+            elif message[0] == 'error':
+                reported.add(message[1])
+                errors.append(message[2])
+            elif best is None or message[1] < best[0]:
+                best = message[1:]
+        if errors:
+            raise errors[0]
+        if len(reported) < workers:
+            codes = [process.exitcode for process in processes]
+            raise Exception(f"HDA* workers exited without a result : exit codes {codes}")
+        if statistics is not None:
+            for field, value in totals.items():
+                setattr(statistics, field, value)
+            statistics.exhausted = exhausted
+
+        if best is None or exhausted is not None:
+            return None
+        path = _trace(shared, processes, best[1])
+    finally:
+        # Workers wait for requests until told to exit
+        shared.stop.set()
+        for inbox in shared.inboxes:
+            inbox.put(None)
+        for process in processes:
+            process.join()
+    return [problem.grounded_actions[i] for i in path]
+
+# Configurations (planner() keyword arguments) run by portfolio() by default
+PORTFOLIO = [
+    dict(),
+    dict(heuristic='hmax'),
+    dict(heuristic='ff', search='gbfs'),
+    dict(heuristic='hadd', search='wastar'),
+]
+
+def _run_configuration(index, problem, configuration, results):
+    """
+    Runs planner() with a configuration and sends back its plan, in a
+    process group of its own, so that it can be killed with the processes
+    it forks (such as HDA* workers)
+    """
+    from .planner import planner
+    os.setpgid(0, 0)
+    start = time.time()
+    try:
+        plan = planner(problem, verbose=False, **configuration)
+    except Exception as e:
+        results.put((index, None, time.time() - start, repr(e)))
+        return
+    if plan is not None:
+        plan = [action.index for action in plan]
+    results.put((index, plan, time.time() - start, None))
+
+def portfolio(problem, configurations=None, deadline=None, first=True, verbose=True):
+    """
+    Runs several planner() configurations on the problem at the same time,
+    one forked process each, and returns (plan, configuration) for the
+    chosen plan, or (None, None) if none is found. Other processes (and
+    the processes they forked) are terminated as soon as the result is known.
+    @arg problem : a pyddl Problem, grounded once and shared by all processes
+    @arg configurations : list of dicts of planner() keyword arguments
+                          (PORTFOLIO by default)
+    @arg deadline : maximum time in seconds to wait for (None for no limit)
+    @arg first : if True, returns the first plan found; otherwise, the
+                 shortest plan found before the deadline
+    @arg verbose : if True, prints how each configuration ended
+    """
+    if configurations is None:
+        configurations = PORTFOLIO
+    context = multiprocessing.get_context('fork')
+    results = context.Queue()
+    # Not daemonic, so that configurations may use search='hdastar'; their
+    # workers are killed with them (see _run_configuration)
+    processes = [context.Process(target=_run_configuration,
+                                 args=(i, problem, configuration, results))
+                 for i, configuration in enumerate(configurations)]
+    start = time.time()
+    best = None
+    try:
+        for process in processes:
+            process.start()
+            # Also set by the child, whichever runs first
+            try:
+                os.setpgid(process.pid, process.pid)
+            except OSError:
+                pass
+        for _ in processes:
+            timeout = None
+            if deadline is not None:
+                timeout = max(deadline - (time.time() - start), 0)
+            try:
+                index, plan, duration, error = results.get(timeout=timeout)
+            except queue.Empty:
+                break
+            if verbose:
+                outcome = error or ('no plan' if plan is None else 'plan length %d' % len(plan))
+                print('%r: %s in %.3f s' % (configurations[index], outcome, duration))
+            if plan is not None and (best is None or len(plan) < len(best[0])):
+                best = (plan, index)
+                if first:
+                    break
+    finally:
+        # Processes are only joined after their group is killed, so that
+        # their ids (and group ids) cannot be reused in the meantime
+        for process in processes:
+            if process.pid is None:
+                continue
+            try:
+                os.killpg(process.pid, signal.SIGTERM)
+            except ProcessLookupError:
+                # No process left in its group
+                pass
+            process.join()
+
+    if best is None:
+        return None, None
+    plan, index = best
+    return [problem.grounded_actions[i] for i in plan], configurations[index]
+
+# Problem and planner() arguments of the batch solved by a worker process
+_batch = None
+
+def _init_batch(problem, kwargs):
+    global _batch
+    _batch = (problem, kwargs)
+
+def _solve_variant(job):
+    """Solves one (index, (init, goal)) job of solve_batch()"""
+    from .planner import planner
+    from .search import SearchStatistics
+    index, (init, goal) = job
+    problem, kwargs = _batch
+    start = time.time()
+    statistics = SearchStatistics()
+    plan = planner(problem.variant(init, goal), verbose=False, statistics=statistics, **kwargs)
+    stats = statistics.as_dict()
+    stats['time'] = time.time() - start
+    if plan is not None:
+        plan = [action.index for action in plan]
+    return index, plan, stats
+
+def solve_batch(problem, variants, workers=None, **kwargs):
+    """
+    Solves many variants of a problem that differ only in init and/or
+    goal, grounding the domain once (see Problem.variant). Yields
+    (index, plan, stats) for each variant, in the order they complete,
+    with stats the SearchStatistics of its search as a dict (see
+    SearchStatistics.as_dict), and the 'time' spent on the variant
+    @arg problem : a pyddl Problem
+    @arg variants : list of (init, goal) pairs, either None to keep
+                    that of problem (init must be None for a problem
+                    grounded with prune or static)
+    @arg workers : number of worker processes (one per CPU by default)
+    @arg kwargs : other planner() keyword arguments, used for every variant
+    """
+    variants = list(variants)
+    if problem.specialized and any(init is not None for init, _ in variants):
+        raise Exception("Cannot change init of a problem grounded with prune or static")
+    # Build the Task and SuccessorGenerator before forking the workers,
+    # which inherit them with the problem
+    problem.successor_generator()
+    context = multiprocessing.get_context('fork')
+    with context.Pool(workers, initializer=_init_batch,
+                      initargs=(problem, kwargs)) as pool:
+        for index, plan, stats in pool.imap_unordered(_solve_variant,
+                                                      enumerate(variants)):
+            if plan is not None:
+                plan = [problem.grounded_actions[i] for i in plan]
+            yield index, plan, stats
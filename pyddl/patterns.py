@@ -0,0 +1,317 @@
+"""
+Pattern database heuristics.
+
+A pattern is a subset of the atoms of the compiled Task. Projecting states
+and grounded actions onto it (dropping the other atoms, and all numeric
+conditions and effects) gives an abstract state space small enough to be
+explored completely: the abstract states reachable from the projected
+init are enumerated, then a backward breadth-first search from those
+satisfying the projected goal gives the distance of each to the goal,
+an admissible estimate for every state projecting onto it.
+
+Abstract states are ranked into a dense table: the atoms of the pattern
+are split into groups of atoms never true together in the abstract states
+explored, and a state is numbered in mixed radix by which atom of each
+group it holds (or none). The table of distances is then an array with a
+slot per combination, without an index of the states explored.
+
+Several patterns are combined by their max, or by their sum, with each
+action costing 1 in only one pattern (the one where it changes the most
+atoms) and 0 in the others, which keeps the sum admissible. Databases
+can be saved to disk to skip building them again.
+"""
+import marshal
+from array import array
+from collections import deque
+from .heuristics import INF
+from .cache import grounding_key, write_atomic, read_marshal
+
+MAGIC = b'PYDDLPD2'
+
+# Table slots of abstract states that are dead ends, or were not explored
+DEAD_END = -1
+UNEXPLORED = -2
+
+# Largest table of a pattern database
+MAX_ENTRIES = 2**26
+
+COMBINE = {'sum': sum, 'max': max}
+
+def pattern_atoms(task, pattern):
+    """
+    Returns the sorted ids of the atoms of a pattern: the atoms (tuples)
+    it lists, and every atom of the task with one of its other elements
+    (objects) as an argument
+    """
+    atoms = set(task.intern(x) for x in pattern if isinstance(x, tuple))
+    objects = set(x for x in pattern if not isinstance(x, tuple))
+    if objects:
+        for i, atom in enumerate(task.atoms):
+            if any(arg in objects for arg in atom[1:]):
+                atoms.add(i)
+    return sorted(atoms)
+
+def _grounding(problem):
+    """
+    Returns the grounding_key() of a problem: of its domain and objects,
+    and of its init if the grounding depends on it
+    """
+    return grounding_key(problem.domain, problem.objects, problem.init, problem.specialized)
+
+class PatternDatabase(object):
+
+    def __init__(self, problem, pattern, costs=None):
+        """
+        Computes the abstract goal distances of a pattern
+        @arg problem : a pyddl Problem
+        @arg pattern : atoms and objects defining the pattern (see pattern_atoms)
+        @arg costs : cost (0 or 1) of each grounded action, in the order of
+                     problem.grounded_actions (1 for all by default)
+        """
+        task = problem.compile()
+        self.task = task
+        self.atoms = pattern_atoms(task, pattern)
+        self.mask = 0
+        for atom in self.atoms:
+            self.mask |= 1 << atom
+        # Groups of atoms (by position in self.atoms), see _rank()
+        self.groups = list()
+        self._ranks = list()
+        # Abstract goal distances by rank, or DEAD_END or UNEXPLORED
+        self.distances = array('l')
+        # Number of abstract states explored
+        self.explored = 0
+        self._build(problem, costs)
+
+    def _build(self, problem, costs):
+        task = self.task
+        mask = self.mask
+        # Distinct projected actions (pos, neg, add, del), each with the
+        # lowest cost of the actions projecting onto it
+        projected = dict()
+        for a, action in enumerate(problem.grounded_actions):
+            compiled = action.compiled
+            if compiled is None:
+                compiled = task.compile_action(action)
+            pos, neg, add, delete = [bits & mask for bits in compiled[:4]]
+            if not add and not delete:
+                continue
+            cost = 1 if costs is None else costs[a]
+            key = (pos, neg, add & ~delete, delete)
+            projected[key] = min(projected.get(key, cost), cost)
+        projected = list(projected.items())
+
+        init = self.project(problem.initial_state())
+        keys = [init]
+        index = {init: 0}
+        predecessors = [list()]
+        i = 0
+        while i < len(keys):
+            bits = keys[i]
+            for (pos, neg, add, delete), cost in projected:
+                if bits & pos == pos and not bits & neg:
+                    successor = (bits | add) & ~delete
+                    if successor == bits:
+                        continue
+                    j = index.get(successor)
+                    if j is None:
+                        j = index[successor] = len(keys)
+                        keys.append(successor)
+                        predecessors.append(list())
+                    predecessors[j].append((i, cost))
+            i += 1
+
+        # Breadth-first search back from the goal, with 0-cost edges
+        # explored first (0-1 BFS)
+        goal_pos, goal_neg, _ = task.condition(problem.goal)
+        goal_pos &= mask
+        goal_neg &= mask
+        distances = array('l', [-1]) * len(keys)
+        queue = deque()
+        for i, bits in enumerate(keys):
+            if bits & goal_pos == goal_pos and not bits & goal_neg:
+                distances[i] = 0
+                queue.append(i)
+        while queue:
+            i = queue.popleft()
+            d = distances[i]
+            for j, cost in predecessors[i]:
+                if distances[j] < 0 or d + cost < distances[j]:
+                    distances[j] = d + cost
+                    if cost:
+                        queue.append(j)
+                    else:
+                        queue.appendleft(j)
+
+        # Groups of atoms never true together, greedily: each atom joins
+        # the first group whose states (indices in keys) it shares none of
+        holding = [set() for _ in self.atoms]
+        positions = {atom: k for k, atom in enumerate(self.atoms)}
+        for i, bits in enumerate(keys):
+            while bits:
+                low = bits & -bits
+                holding[positions[low.bit_length() - 1]].add(i)
+                bits ^= low
+        groups = list()
+        states = list()
+        for k in range(len(self.atoms)):
+            for group, held in zip(groups, states):
+                if held.isdisjoint(holding[k]):
+                    group.append(k)
+                    held.update(holding[k])
+                    break
+            else:
+                groups.append([k])
+                states.append(set(holding[k]))
+        self._set_groups(groups)
+        table = array('l', [UNEXPLORED]) * self._size
+        for bits, d in zip(keys, distances):
+            table[self._rank(bits)] = d
+        self.distances = table
+        self.explored = len(keys)
+
+    def _set_groups(self, groups):
+        """
+        Sets the groups of atoms (lists of positions in self.atoms) and,
+        for each, the rank of every bitmask of its atoms that a state can
+        hold, by mixed radix: (position in group + 1) * stride, 0 for none
+        """
+        self.groups = groups
+        self._ranks = list()
+        stride = 1
+        for group in groups:
+            ranks = {0: 0}
+            mask = 0
+            for digit, k in enumerate(group, 1):
+                bit = 1 << self.atoms[k]
+                ranks[bit] = digit * stride
+                mask |= bit
+            self._ranks.append((mask, ranks))
+            stride *= len(group) + 1
+            if stride > MAX_ENTRIES:
+                raise Exception(f"Pattern database over {MAX_ENTRIES} entries : "
+                                f"{len(self.atoms)} atoms in {len(groups)} groups")
+        self._size = stride
+
+    def _rank(self, bits):
+        """
+        Returns the slot of an abstract state in self.distances, or None
+        if it holds several atoms of a group (so was not explored)
+        """
+        rank = 0
+        for mask, ranks in self._ranks:
+            r = ranks.get(bits & mask)
+            if r is None:
+                return None
+            rank += r
+        return rank
+
+    def project(self, state):
+        """Returns the abstract state (atom bitmask) of a State or PackedState"""
+        bits = getattr(state, 'bits', None)
+        if bits is None:
+            atom_ids = self.task.atom_ids
+            bits = 0
+            for p in state.predicates:
+                i = atom_ids.get(p)
+                if i is not None:
+                    bits |= 1 << i
+        return bits & self.mask
+
+    def __len__(self):
+        """Returns the number of abstract states explored"""
+        return self.explored
+
+    def __call__(self, state):
+        # States projecting outside the abstract space explored from init
+        # (not reachable from init) get no estimate
+        i = self._rank(self.project(state))
+        if i is None:
+            return 0
+        d = self.distances[i]
+        if d == UNEXPLORED:
+            return 0
+        return INF if d == DEAD_END else d
+
+class PatternDatabases(object):
+    """
+    Heuristic combining the pattern databases of several patterns
+    """
+
+    def __init__(self, problem, patterns, combine=sum):
+        """
+        @arg problem : a pyddl Problem
+        @arg patterns : list of patterns (see pattern_atoms)
+        @arg combine : sum (additive, with action costs split between
+                       patterns) or max, how estimates are combined
+        """
+        self.combine = combine
+        self.grounding = _grounding(problem)
+        self.goal = sorted(map(repr, problem.goal))
+        costs = [None] * len(patterns)
+        if combine is sum:
+            task = problem.compile()
+            masks = list()
+            for pattern in patterns:
+                mask = 0
+                for atom in pattern_atoms(task, pattern):
+                    mask |= 1 << atom
+                masks.append(mask)
+            costs = [list() for _ in patterns]
+            for action in problem.grounded_actions:
+                compiled = action.compiled
+                if compiled is None:
+                    compiled = task.compile_action(action)
+                changed = compiled[2] | compiled[3]
+                counts = [bin(changed & mask).count('1') for mask in masks]
+                owner = counts.index(max(counts)) if any(counts) else None
+                for k in range(len(patterns)):
+                    costs[k].append(1 if k == owner else 0)
+        self.databases = [PatternDatabase(problem, pattern, cost)
+                          for pattern, cost in zip(patterns, costs)]
+
+    def __call__(self, state):
+        return self.combine([database(state) for database in self.databases])
+
+    def save(self, path):
+        """
+        Writes the databases to a file, replacing it atomically, with the
+        grounding of the problem they were built for
+        """
+        databases = [([database.task.atoms[atom] for atom in database.atoms],
+                      database.groups, database.explored, database.distances.tobytes())
+                     for database in self.databases]
+        payload = (self.combine.__name__, self.grounding, self.goal, databases)
+        write_atomic(path, MAGIC, marshal.dumps(payload))
+
+    @staticmethod
+    def load(problem, path):
+        """
+        Returns the PatternDatabases stored in a file by save(), for a
+        problem of the same domain, objects (and init, if grounded with
+        prune or static) and goal
+        """
+        combine, grounding, goal, databases = read_marshal(path, MAGIC)
+        if grounding != _grounding(problem):
+            raise Exception(f"Pattern databases of another grounding : {path}")
+        if goal != sorted(map(repr, problem.goal)):
+            raise Exception(f"Pattern databases of another goal : {path}")
+        task = problem.compile()
+        self = PatternDatabases.__new__(PatternDatabases)
+        self.combine = COMBINE[combine]
+        self.grounding = grounding
+        self.goal = goal
+        self.databases = list()
+        for atoms, groups, explored, distances in databases:
+            database = PatternDatabase.__new__(PatternDatabase)
+            database.task = task
+            database.atoms = [task.intern(atom) for atom in atoms]
+            database.mask = 0
+            for atom in database.atoms:
+                database.mask |= 1 << atom
+            database._set_groups(groups)
+            database.explored = explored
+            database.distances = array('l')
+            database.distances.frombytes(distances)
+            self.databases.append(database)
+        return self
@@ -1,78 +1,479 @@
 from __future__ import print_function
-from time import time
+from time import time, perf_counter
 import heapq
+from itertools import count
+from .pyddl import Action
+from .heuristics import HEURISTICS, INF, cached_heuristic
+from .search import NodeTable, HeapOpenList, BucketOpenList, SearchStatistics, SearchBudget
+from .hooks import SearchHooks, instrument
+from .regression import regression_search, bidirectional_search
+from .parallel import hda_star
 
 def planner(problem, heuristic=None, state0=None, goal=None,
-            monotone=False, verbose=True):
+            monotone=False, verbose=True, cache=False, search='astar',
+            transpositions=None, weight=2, open_list='heap',
+            tie_breaking='low-h', workers=None, statistics=None, hooks=None,
+            deadline=None, max_expansions=None, max_memory=None):
     """
-    Implements A* search to find a plan for the given problem.
+    Implements A* search (or a variant of it, see search) to find a plan
+    for the given problem.
     Arguments:
     problem   - a pyddl Problem
-    heuristic - a heuristic to use (h(state) = 0 by default)
+    heuristic - a heuristic to use (h(state) = 0 by default), or the name
+                of one built from the problem: 'hmax', 'hadd', 'ff' or
+                'lmcount' (see HEURISTICS); a heuristic that is also a
+                SearchHooks is called as hooks too (it cannot be cached,
+                nor used by 'hdastar')
     state0    - initial state (problem.initial_state by default)
     goal      - tuple containing goal predicates and numerical conditions
-                (default is (problem.goals, problem.num_goals))
+                (default is problem.goal)
     monotone  - if True, only applies actions by ignoring delete lists
-    verbose   - if True, prints statistics before returning
+    verbose   - if True, prints statistics before returning; if 2, also
+                prints every successor generated
+    cache     - if True (or a maximum number of entries), memoize heuristic
+                values in a HeuristicCache shared by all planner() calls
+                on the same problem and heuristic
+    search    - the search algorithm, ordering states by:
+                'astar'   - f = g + h (default; optimal if h is admissible)
+                'wastar'  - f = g + weight * h (weighted A*; plans cost at
+                            most weight times the optimum)
+                'gbfs'    - h only (greedy best-first; fast, any plan)
+                'ucs'     - g only (uniform-cost; heuristic is not evaluated)
+                'idastar' - f = g + h, by iterative deepening (memory
+                            linear in the plan length)
+                'hdastar' - f = g + h, by hash-distributed A* over several
+                            processes (see parallel.hda_star)
+                'regression' - f = g + h by A* backwards from the goal over
+                            partial states, with h built in (h_max from
+                            state0; no other heuristic can be given),
+                            pruning partial states with atoms mutually
+                            exclusive from state0; for small, goal-directed
+                            problems without numeric fluents (partial
+                            states can be far more numerous than states)
+                'bidirectional' - breadth-first search forwards from state0
+                            and backwards from the goal until they meet
+                            (optimal; no heuristic can be given, no
+                            numeric fluents)
+                'anytime' - f = g + weight * h, then lower weights after
+                            each plan found, until the last plan is proven
+                            optimal or the budget runs out; returns the
+                            best plan found (see statistics.bound)
+    transpositions - for 'idastar', the maximum number of states kept in a
+                transposition table to prune paths reaching a state at no
+                lower cost (None for no table)
+    weight    - for 'wastar' and 'anytime', the (initial) weight of h
+    open_list - for best-first searches, 'heap' (default) or 'buckets'
+                (constant time operations for integer f-values)
+    tie_breaking - for 'buckets', how to order states of equal f:
+                'low-h' (default), 'lifo' or 'fifo' (see BucketOpenList)
+    workers   - for 'hdastar', the number of worker processes
+                (one per CPU by default)
+    statistics - if given, a SearchStatistics filled in with the
+                counters of the search
+    hooks     - if given, a SearchHooks (or a list of them) called during
+                the search (not supported by 'hdastar', 'regression' and
+                'bidirectional'); see hooks.ActionProfiler
+    deadline  - if given, seconds after which the search gives up
+    max_expansions - if given, number of expansions after which the search
+                gives up (not supported by 'hdastar')
+    max_memory - if given, resident process memory in bytes after which the
+                search gives up (not supported by 'hdastar')
+                When a budget runs out, statistics.exhausted names it, and
+                None is returned ('anytime' returns its best plan so far)
     """
     if heuristic is None:
         heuristic = null_heuristic
+    elif search in ('regression', 'bidirectional'):
+        raise Exception(f"Heuristics are not supported by {search}")
+    if cache:
+        maxsize = 2**16 if cache is True else cache
+        heuristic = cached_heuristic(problem, heuristic, maxsize)
+    elif isinstance(heuristic, str):
+        heuristic = HEURISTICS[heuristic](problem)
+    if statistics is None:
+        statistics = SearchStatistics()
     if state0 is None:
-        state0 = problem.initial_state
+        state0 = problem.initial_state()
     if goal is None:
-        goal = (problem.goals, problem.num_goals)
+        goal = problem.goal
+    # Precompute the goal test like the preconditions of a grounded action
+    goal = Action('goal', preconditions=tuple(goal)).ground()
+
+    if open_list == 'heap':
+        fringe = HeapOpenList()
+    elif open_list == 'buckets':
+        fringe = BucketOpenList(tie_breaking)
+    else:
+        raise Exception(f"Invalid open list : {open_list}")
+
+    # Build the successor generator before timing the search
+    problem.successor_generator()
+    statistics.ground_time = problem.ground_time
+
+    budget = None
+    if deadline is not None or max_expansions is not None or max_memory is not None:
+        budget = SearchBudget(deadline, max_expansions, max_memory)
+    if search in ('hdastar', 'regression', 'bidirectional'):
+        if hooks is not None:
+            raise Exception(f"Hooks are not supported by {search}")
+        if search == 'hdastar' and isinstance(heuristic, SearchHooks):
+            raise Exception("Heuristics following paths are not supported by hdastar")
+    elif isinstance(heuristic, SearchHooks):
+        # Heuristics following paths, such as LandmarkCountHeuristic,
+        # are called along with the given hooks
+        hooks = heuristic if hooks is None else [hooks, heuristic]
+    if search == 'hdastar':
+        if max_expansions is not None or max_memory is not None:
+            raise Exception("Only deadlines are supported by hdastar")
+    else:
+        functions = instrument(hooks, problem, state0, heuristic)
 
-    states_explored = 0
-    closed = set()
-    fringe = [(heuristic(state0), -state0.cost, state0)]
-    heapq.heapify(fringe)
     start = time()
-    while True:
-        if len(fringe) == 0:
-            if verbose: print('States Explored: %d' % states_explored)
-            return None
+    if search == 'astar':
+        plan = _astar(problem, functions, state0, goal, monotone, verbose, fringe,
+                      1, 1, budget, statistics)
+    elif search == 'wastar':
+        plan = _astar(problem, functions, state0, goal, monotone, verbose, fringe,
+                      1, weight, budget, statistics)
+    elif search == 'gbfs':
+        plan = _astar(problem, functions, state0, goal, monotone, verbose, fringe,
+                      0, 1, budget, statistics)
+    elif search == 'ucs':
+        plan = _astar(problem, functions, state0, goal, monotone, verbose, fringe,
+                      1, 0, budget, statistics)
+    elif search == 'idastar':
+        plan = _idastar(problem, functions, state0, goal, monotone, verbose,
+                        transpositions, budget, statistics)
+    elif search == 'anytime':
+        plan = _anytime(problem, functions, state0, goal, monotone, verbose,
+                        weight, budget, statistics)
+    elif search == 'regression':
+        plan = regression_search(problem, state0, goal, budget, statistics)
+    elif search == 'bidirectional':
+        plan = bidirectional_search(problem, state0, goal, monotone, budget, statistics)
+    elif search == 'hdastar':
+        plan = hda_star(problem, heuristic, state0, goal, monotone, workers,
+                        statistics, deadline)
+    else:
+        raise Exception(f"Invalid search : {search}")
+    statistics.search_time = time() - start
+    statistics.plan_length = None if plan is None else len(plan)
+    if verbose: _report(statistics)
+    return plan
+
+def _report(statistics):
+    """Prints the statistics of a search"""
+    s = statistics
+    print('Generated: %d (%d duplicates, %d reopened)' % (s.generated, s.duplicates, s.reopened))
+    print('Peak open/closed: %d/%d' % (s.peak_open, s.peak_closed))
+    print('Heuristic evaluations: %d (%.3f s)' % (s.evaluations, s.heuristic_time))
+    print('Grounding time: %.3f s' % s.ground_time)
+    if s.exhausted is not None:
+        print('Budget exhausted: %s' % s.exhausted)
+    if s.bound is not None:
+        print('Suboptimality bound: %.3f' % s.bound)
+    print('States Explored: %d' % s.expanded)
+    if s.plan_length is not None:
+        print('Time per state: %.3f ms' % (1000*s.search_time / max(s.expanded, 1)))
+        print('Plan length: %d' % s.plan_length)
 
-        # Get node with minimum evaluation function from heap
-        h, _, node = heapq.heappop(fringe)
+def _astar(problem, functions, state0, goal, monotone, verbose, fringe,
+           g_weight, h_weight, budget, statistics):
+    """
+    Best-first search with a NodeTable, ordering states in the open list
+    fringe by f = g_weight * g + h_weight * h, calling the hooks and
+    functions returned by hooks.instrument(); see planner()
+    """
+    (on_expand, on_generate, on_goal,
+     applicable, successor_of, is_applicable, heuristic) = functions
+    actions = problem.grounded_actions
+    # Counters are kept in locals, and stored in statistics at the end
+    generated = duplicates = evaluations = peak_open = 0
+    heuristic_time = 0.0
+    next_check = budget.start() if budget is not None else INF
+    exhausted = None
+
+    # Search nodes live in a NodeTable; the fringe holds (node index, g)
+    table = NodeTable()
+    root, _ = table.insert(state0, 0)
+    states_explored = 0
+    h = 0
+    if h_weight:
+        t = perf_counter()
+        h = heuristic(state0)
+        heuristic_time += perf_counter() - t
+        evaluations += 1
+    # States the heuristic proves dead ends (h = INF) are never pushed
+    if h < INF:
+        fringe.push(h_weight * h, 0, h, (root, 0))
+    plan = None
+    while len(fringe):
+        if len(fringe) > peak_open:
+            peak_open = len(fringe)
+
+        # Get node with minimum evaluation function from the open list
+        i, g = fringe.pop()
+        # Skip nodes already expanded, or reached again by a cheaper path
+        if table.closed[i] or g != table.g[i]:
+            continue
+        if states_explored >= next_check:
+            exhausted = budget.exhausted(states_explored)
+            if exhausted is not None:
+                break
+            next_check = budget.next_check(states_explored)
+        table.closed[i] = 1
         states_explored += 1
+        node = table.states[i]
+        if on_expand is not None:
+            on_expand(node, g)
 
         # Goal test
-        if node.is_true(*goal):
-            plan = node.plan()
-            dur = time() - start
-            if verbose:
-                print('States Explored: %d' % states_explored)
-                print('Time per state: %.3f ms' % (1000*dur / states_explored))
-                print('Plan length: %d' % node.cost)
-            return plan
-
-        # Expand node if we haven't seen it before
-        if node not in closed:
-            closed.add(node)
-
-            # Apply all applicable actions to get successors
-            if not verbose:
-                successors = set(node.apply(action, monotone)
-                                 for action in problem.grounded_actions
-                                 if node.is_true(action.preconditions, action.num_preconditions))
-            else:
-                successors = set()
-                for action in problem.grounded_actions:
-                    if node.is_true(action.preconditions, action.num_preconditions):
-                        print(f"Action : {action}")
-                        next_node = node.apply(action, monotone)
-                        successors.add(next_node)
+        if is_applicable(node, goal):
+            plan = table.plan(i, actions)
+            if on_goal is not None:
+                on_goal(node, plan)
+            break
+
+        # Apply all applicable actions to get successors, then
+        # compute heuristic and add new or improved ones to fringe
+        for action in applicable(node):
+            successor = successor_of(node, action, monotone)
+            generated += 1
+            if on_generate is not None:
+                on_generate(node, action, successor)
+            if verbose > 1:
+                print(f"Action : {action}")
+                print('----- next node -----')
+                print(successor)
+                print('==========')
+            j, improved = table.insert(successor, g + 1, i, action.index)
+            if not improved:
+                duplicates += 1
+                continue
+            if h_weight:
+                t = perf_counter()
+                h = heuristic(successor)
+                heuristic_time += perf_counter() - t
+                evaluations += 1
+                if h == INF:
+                    continue
+            fringe.push(g_weight * (g + 1) + h_weight * h, g + 1, h, (j, g + 1))
+
+    statistics.expanded = states_explored
+    statistics.generated = generated
+    statistics.duplicates = duplicates
+    statistics.peak_open = peak_open
+    statistics.peak_closed = states_explored
+    statistics.evaluations = evaluations
+    statistics.heuristic_time = heuristic_time
+    statistics.exhausted = exhausted
+    return plan
 
-                        print('----- next node -----')
-                        print(next_node)
-                        print('==========')
+def _idastar(problem, functions, state0, goal, monotone, verbose, table_size,
+             budget, statistics):
+    """
+    Iterative deepening A*: repeated depth-first searches bounded by
+    f = g + h, raising the bound to the smallest f exceeding it, calling
+    the hooks and functions returned by hooks.instrument(); see planner()
+    """
+    (on_expand, on_generate, on_goal,
+     applicable, successor_of, is_applicable, heuristic) = functions
+    generated = duplicates = peak_open = peak_closed = 0
+    heuristic_time = 0.0
+    evaluations = 1
+    next_check = budget.start() if budget is not None else INF
+    exhausted = None
+
+    states_explored = 0
+    t = perf_counter()
+    bound = heuristic(state0)
+    heuristic_time += perf_counter() - t
+    plan = list()
+    while not is_applicable(state0, goal):
+        minimum = INF
+        transpositions = dict() if table_size else None
+        # Each frame holds a state on the current path, its g and an
+        # iterator over its applicable actions
+        if on_expand is not None:
+            on_expand(state0, 0)
+        stack = [(state0, 0, iter(applicable(state0)))]
+        on_path = {state0}
+        plan = list()
+        states_explored += 1
+        while stack:
+            state, g, successors = stack[-1]
+            action = next(successors, None)
+            if action is None:
+                stack.pop()
+                on_path.discard(state)
+                if plan:
+                    plan.pop()
+                continue
+            successor = successor_of(state, action, monotone)
+            generated += 1
+            if on_generate is not None:
+                on_generate(state, action, successor)
+            if successor in on_path:
+                duplicates += 1
+                continue
+            if transpositions is not None:
+                seen = transpositions.get(successor)
+                if seen is not None and seen <= g + 1:
+                    duplicates += 1
+                    continue
+                if seen is not None or len(transpositions) < table_size:
+                    transpositions[successor] = g + 1
+            t = perf_counter()
+            f = g + 1 + heuristic(successor)
+            heuristic_time += perf_counter() - t
+            evaluations += 1
+            if f > bound:
+                minimum = min(minimum, f)
+                continue
+            plan.append(action)
+            if is_applicable(successor, goal):
+                if on_goal is not None:
+                    on_goal(successor, plan)
+                break
+            if states_explored >= next_check:
+                exhausted = budget.exhausted(states_explored)
+                if exhausted is not None:
+                    break
+                next_check = budget.next_check(states_explored)
+            states_explored += 1
+            if on_expand is not None:
+                on_expand(successor, g + 1)
+            stack.append((successor, g + 1, iter(applicable(successor))))
+            on_path.add(successor)
+            if len(stack) > peak_open:
+                peak_open = len(stack)
+        if transpositions is not None and len(transpositions) > peak_closed:
+            peak_closed = len(transpositions)
+        if exhausted is not None:
+            plan = None
+            break
+        if stack:
+            break
+        if minimum == INF:
+            plan = None
+            break
+        bound = minimum
+
+    statistics.expanded = states_explored
+    statistics.generated = generated
+    statistics.duplicates = duplicates
+    statistics.peak_open = peak_open
+    statistics.peak_closed = peak_closed
+    statistics.evaluations = evaluations
+    statistics.heuristic_time = heuristic_time
+    statistics.exhausted = exhausted
+    return plan
+
+def _anytime(problem, functions, state0, goal, monotone, verbose, weight,
+             budget, statistics):
+    """
+    Anytime weighted A*: best-first search by f = g + weight * h that
+    carries on after each plan found, with the weight halved towards 1,
+    reopening states reached by cheaper paths and pruning those whose
+    g + h is no lower than the length of the best plan, until no state is
+    left (the best plan is then optimal, if h is admissible) or the budget
+    runs out. Sets statistics.bound to the ratio of the best plan length
+    to the lowest g + h left open; see planner()
+    """
+    (on_expand, on_generate, on_goal,
+     applicable, successor_of, is_applicable, heuristic) = functions
+    actions = problem.grounded_actions
+    generated = duplicates = reopened = evaluations = peak_open = 0
+    heuristic_time = 0.0
+    next_check = budget.start() if budget is not None else INF
+    exhausted = None
+
+    # The open list holds (f, -g, counter, node index, g) entries, and
+    # is reordered whenever the weight changes
+    table = NodeTable()
+    root, _ = table.insert(state0, 0)
+    t = perf_counter()
+    h_values = [heuristic(state0)]
+    heuristic_time += perf_counter() - t
+    evaluations += 1
+    counter = count()
+    fringe = [(weight * h_values[root], 0, next(counter), root, 0)]
+    states_explored = 0
+    best = INF
+    plan = None
+    while fringe:
+        if len(fringe) > peak_open:
+            peak_open = len(fringe)
+        if states_explored >= next_check:
+            exhausted = budget.exhausted(states_explored)
+            if exhausted is not None:
+                break
+            next_check = budget.next_check(states_explored)
+
+        _, _, _, i, g = heapq.heappop(fringe)
+        if table.closed[i] or g != table.g[i] or g + h_values[i] >= best:
+            continue
+        table.closed[i] = 1
+        states_explored += 1
+        node = table.states[i]
+        if on_expand is not None:
+            on_expand(node, g)
+
+        if is_applicable(node, goal):
+            best = g
+            plan = table.plan(i, actions)
+            if on_goal is not None:
+                on_goal(node, plan)
+            if verbose > 1:
+                print('Plan of length %d found with weight %g' % (best, weight))
+            weight = 1 + (weight - 1) / 2 if weight > 1.05 else 1
+            fringe = [(g + weight * h_values[j], -g, c, j, g)
+                      for _, _, c, j, g in fringe
+                      if g == table.g[j] and not table.closed[j] and g + h_values[j] < best]
+            heapq.heapify(fringe)
+            continue
 
+        for action in applicable(node):
+            successor = successor_of(node, action, monotone)
+            generated += 1
+            if on_generate is not None:
+                on_generate(node, action, successor)
+            j = table.ids.get(successor)
+            if j is None:
+                j, _ = table.insert(successor, g + 1, i, action.index)
+                t = perf_counter()
+                h_values.append(heuristic(successor))
+                heuristic_time += perf_counter() - t
+                evaluations += 1
+            elif g + 1 < table.g[j]:
+                if table.closed[j]:
+                    table.closed[j] = 0
+                    reopened += 1
+                table.g[j] = g + 1
+                table.parent[j] = i
+                table.action[j] = action.index
+            else:
+                duplicates += 1
+                continue
+            h = h_values[j]
+            if g + 1 + h < best:
+                heapq.heappush(fringe, (g + 1 + weight * h, -(g + 1), next(counter), j, g + 1))
 
-            # Compute heuristic and add to fringe
-            for successor in successors:
-                if successor not in closed:
-                    f = successor.cost + heuristic(successor)
-                    heapq.heappush(fringe, (f, -successor.cost, successor))
+    if plan is not None:
+        # Any better plan goes through a state left open
+        lower = min([g + h_values[j] for _, _, _, j, g in fringe
+                     if g == table.g[j] and not table.closed[j]] + [best])
+        statistics.bound = best / lower if lower else 1.0
+    statistics.expanded = states_explored
+    statistics.generated = generated
+    statistics.duplicates = duplicates
+    statistics.reopened = reopened
+    statistics.peak_open = peak_open
+    statistics.peak_closed = sum(table.closed)
+    statistics.evaluations = evaluations
+    statistics.heuristic_time = heuristic_time
+    statistics.exhausted = exhausted
+    return plan
 
 
 ########## HEURISTICS ##########
@@ -99,11 +500,8 @@ def subgoal_heuristic(problem):
     """Heuristic that computes the max cost of plans across all subgoals"""
     def h(state):
         costs = []
-        for g in problem.goals:
-            subgoal_plan = planner(problem, null_heuristic, state, ((g,), ()))
-            costs.append(plan_cost(subgoal_plan))
-        for g in problem.num_goals:
-            subgoal_plan = planner(problem, null_heuristic, state, ((), (g,)))
+        for g in problem.goal:
+            subgoal_plan = planner(problem, null_heuristic, state, (g,), verbose=False)
             costs.append(plan_cost(subgoal_plan))
         return max(costs)
     return h
@@ -4,7 +4,8 @@ code based on : https://github.com/garydoranjr/pyddl
 Classes and functions that allow creating a PDDL-like
 problem and domain definition for planning
 """
-from itertools import product
+from itertools import product, islice
+from time import time
 import operator as ops
 import copy
 
@@ -27,11 +28,41 @@ class Domain(object):
         """
         self.actions = tuple(actions)
 
-    def ground(self, objects):
+        # Predicate and function symbols changed by some effect
+        self.fluents = frozenset(_symbol(effect) for action in self.actions
+                                 for effect in action.effects)
+
+    def is_static(self, predicate):
+        """
+        Checks whether a (lifted or grounded) predicate or numeric
+        condition only mentions symbols that no effect changes,
+        so that its value is the same in every state
+        """
+        if predicate[0] == -1:
+            return self.is_static(predicate[1])
+        if predicate[0] in NUM_OPS and len(predicate) == 3:
+            return all(type(o) == int or _symbol(o) not in self.fluents
+                       for o in predicate[1:])
+        return predicate[0] not in self.fluents
+
+    def ground(self, objects, init=None, prune=True, static=False):
         """
         Ground all action schemas given a dictionary
-        of objects keyed by type
+        of objects keyed by type. If init is given:
+        - if prune, only the actions reachable from it (ignoring
+          delete lists and numeric conditions) are grounded
+        - if static, static preconditions are evaluated against it;
+          actions failing them are discarded and the rest have
+          them removed from their preconditions
         """
+        if init is not None:
+            if prune:
+                grounded_actions = self._ground_reachable(objects, init)
+            else:
+                grounded_actions = self.ground(objects)
+            if static:
+                grounded_actions = self._strip_static(grounded_actions, init)
+            return grounded_actions
         grounded_actions = list()
         for action in self.actions:
             param_lists = [objects[t] for t in action.types]
@@ -46,23 +77,212 @@ class Domain(object):
                 grounded_actions.append(action.ground(*params))
         return grounded_actions
 
+    def _ground_reachable(self, objects, init):
+        """
+        Relaxed reachability analysis: starting from the atoms of init,
+        bind every action schema against the reached atoms and add the
+        effects of the new groundings, until a fixpoint. Each round only
+        looks for bindings using at least one atom reached in the previous
+        round (semi-naive evaluation)
+        """
+        reached = set(pre for pre in init if pre[0] != '=')
+        groundings = {action: dict() for action in self.actions}
+        # Reached atoms by (symbol, length), in the order they were reached
+        index = dict()
+        new = list(reached)
+        first = True
+        while new or first:
+            # Atoms reached before the last round are a prefix of each list
+            old_sizes = {key: len(atoms) for key, atoms in index.items()}
+            new_index = dict()
+            for atom in new:
+                index.setdefault(_key(atom), list()).append(atom)
+                new_index.setdefault(_key(atom), list()).append(atom)
+            new = list()
+            for action in self.actions:
+                preconditions = _positive(action)
+                if not preconditions and not first:
+                    continue
+                # Bindings whose k-th precondition matches a new atom, with
+                # those before it matching old atoms only (so none is found
+                # twice) and those after it any reached atom
+                for k in range(max(len(preconditions), 1)):
+                    def candidates(i, k=k):
+                        key = _key(preconditions[i])
+                        if i < k:
+                            return islice(index.get(key, ()), old_sizes.get(key, 0))
+                        if i == k:
+                            return new_index.get(key, ())
+                        return index.get(key, ())
+                    for params in _bindings(action, objects, candidates, k):
+                        if params in groundings[action]:
+                            continue
+                        if action.unique and len(set(params)) != len(params):
+                            continue
+                        grounded = groundings[action][params] = action.ground(*params)
+                        for effect in grounded.add_effects:
+                            if effect not in reached:
+                                reached.add(effect)
+                                new.append(effect)
+            first = False
+
+        # Emit groundings in the same order as the full product
+        grounded_actions = list()
+        for action in self.actions:
+            positions = [{o: i for i, o in enumerate(objects[t])} for t in action.types]
+            order = lambda params: tuple(p[o] for p, o in zip(positions, params))
+            param_combos = set()
+            for params in sorted(groundings[action], key=order):
+                param_set = frozenset(params)
+                if action.no_permute and param_set in param_combos:
+                    continue
+                param_combos.add(param_set)
+                grounded_actions.append(groundings[action][params])
+        return grounded_actions
+
+    def _strip_static(self, grounded_actions, init):
+        """
+        Evaluates the static preconditions of grounded actions against
+        init, keeping only the actions that satisfy them, without them
+        """
+        atoms = set(pre for pre in init if pre[0] != '=')
+        functions = {pre[1]: pre[2] for pre in init if pre[0] == '='}
+        stripped = list()
+        for action in grounded_actions:
+            static = [pre for pre in action.preconditions if self.is_static(pre)]
+            if static:
+                if not all(_holds(pre, atoms, functions) for pre in static):
+                    continue
+                action.preconditions = [pre for pre in action.preconditions
+                                        if not self.is_static(pre)]
+                action.precompute()
+            stripped.append(action)
+        return stripped
+
 class Problem(object):
 
-    def __init__(self, domain, objects, init=(), goal=()):
+    def __init__(self, domain, objects, init=(), goal=(), compiled=False,
+                 prune=False, static=False, cache_dir=None):
         """
         Represents a PDDL Problem Specification
         @arg domain : Domain object specifying domain
         @arg objects : dictionary of object tuples keyed by type
         @arg init : tuple of initial state predicates
         @arg goal : tuple of goal state predicates
+        @arg compiled : if True, search over compiled (bitmask) states
+        @arg prune : if True, only ground actions that are relaxed-reachable
+                     from init
+        @arg static : if True, evaluate static predicates while grounding
+                      and drop them from init, goal and states
+                      (they are kept in self.static)
+        @arg cache_dir : if given, a directory where grounded actions are
+                         stored with their compiled Task and
+                         SuccessorGenerator, and loaded from when the
+                         domain and objects are unchanged (see cache.py)
         """
         # Ground actions from domain
-        self.grounded_actions = domain.ground(objects)
+        start = time()
+        if cache_dir is not None:
+            from .cache import cached_grounding
+            self.grounded_actions, finish = cached_grounding(cache_dir, domain, objects,
+                                                             init, prune, static)
+        elif prune or static:
+            self.grounded_actions = domain.ground(objects, init, prune, static)
+        else:
+            self.grounded_actions = domain.ground(objects)
+
+        self.domain = domain
+        self.objects = objects
+        self.static = frozenset()
+        self.static_functions = None
+        if static:
+            atoms = set(pre for pre in init if pre[0] != '=')
+            self.static = frozenset(pre for pre in atoms if domain.is_static(pre))
+            self.static_functions = {pre[1]: pre[2] for pre in init if pre[0] == '='}
+            init = tuple(pre for pre in init if pre not in self.static)
+            goal = self._static_goal(goal)
+
+        # Index actions, so that search nodes can refer to them compactly
+        for i, action in enumerate(self.grounded_actions):
+            action.index = i
 
         self.init = init 
         self.goal = goal
+        self.compiled = compiled
+        # Whether the grounding depends on init, so cannot be shared
+        self.specialized = prune or static
+        self._task = None
+        self._successors = None
+        self.ground_time = 0
+        if cache_dir is not None:
+            # Restore the Task and SuccessorGenerator from the cache, or
+            # build and store them with the grounded actions
+            finish(self)
+        # Seconds spent grounding, compiling and indexing the actions
+        self.ground_time = time() - start
+        # HeuristicCaches shared by searches on this problem
+        self.heuristic_caches = dict()
+
+    def _static_goal(self, goal):
+        """
+        Returns the goal without its static conditions that hold in init;
+        those that do not are kept, so that the goal stays unsatisfiable
+        """
+        return tuple(pre for pre in goal if not self.domain.is_static(pre)
+                     or not _holds(pre, self.static, self.static_functions))
+
+    def variant(self, init=None, goal=None):
+        """
+        Returns a Problem with another init and/or goal, sharing the
+        grounded actions, compiled Task and SuccessorGenerator of this one
+        instead of grounding the domain again
+        @arg init : tuple of initial state predicates (self.init by default)
+        @arg goal : tuple of goal state predicates (self.goal by default)
+        """
+        if self.specialized and init is not None:
+            raise Exception("Cannot change init of a problem grounded with prune or static")
+        problem = copy.copy(self)
+        if init is not None:
+            problem.init = tuple(init)
+        if goal is not None:
+            problem.goal = tuple(goal)
+            if self.static_functions is not None:
+                problem.goal = problem._static_goal(problem.goal)
+        # Build them now, so that the Task and SuccessorGenerator are shared
+        self.successor_generator()
+        problem._task = self._task
+        problem._successors = self._successors
+        problem.heuristic_caches = dict()
+        return problem
+
+    def compile(self):
+        """
+        Returns the compiled Task for this problem, in which every
+        grounded atom is interned to an integer id (built once, on demand)
+        """
+        if self._task is None:
+            from .task import Task
+            start = time()
+            self._task = Task(self)
+            self.ground_time += time() - start
+        return self._task
+
+    def successor_generator(self):
+        """
+        Returns the SuccessorGenerator indexing the grounded actions
+        of this problem (built once, on demand)
+        """
+        if self._successors is None:
+            from .successors import SuccessorGenerator
+            task = self.compile() if self.compiled else None
+            start = time()
+            self._successors = SuccessorGenerator(self.grounded_actions, task)
+            self.ground_time += time() - start
+        return self._successors
 
     def initial_state(self):
+        if self.compiled:
+            return self.compile().state(self.init)
         return State(self.init)
 
 class State(object):
@@ -72,50 +292,71 @@ class State(object):
         self.predicates = frozenset(predicates)
         self.predecessor = predecessor
         self.cost = cost
+        self._functions = None
+
+    @property
+    def key(self):
+        """Hashable value identifying the state, however it was reached"""
+        return self.predicates
+
+    @property
+    def functions(self):
+        """Dictionary of numeric function values, built on first use"""
+        if self._functions is None:
+            self._functions = {pre[1]: pre[2] for pre in self.predicates if pre[0] == "="}
+        return self._functions
 
     def is_true(self, preconditions):
-        preds = set([pre for pre in self.predicates if pre[0] != "="])
-        num_preds = set(self.predicates) - preds
-        functions = {func: num for _, func, num in num_preds}
+        functions = self.functions
 
-        def _num_pred(op, x, y):
-            operands = [0, 0]
-            for i, o in enumerate((x, y)):
-                if type(o) == int:
-                    operands[i] = o
-                else:
-                    operands[i] = functions.get(o, o)
-            return NUM_OPS[op](*operands)
+        preconds = [precond for precond in preconditions if precond[0] not in NUM_OPS and precond[0] != -1]
+        neg_preconds = [precond[1] for precond in preconditions if precond[0] == -1]
+        num_preconds = [_num_condition(*precond)(functions) for precond in preconditions if precond[0] in NUM_OPS]
 
-        preconds = [precond for precond in preconditions if precond[0] not in NUM_OPS]
-        num_preconds = [_num_pred(*precond) for precond in preconditions if precond[0] in NUM_OPS]
+        return all(p in self.predicates for p in preconds) and \
+            not any(p in self.predicates for p in neg_preconds) and all(p for p in num_preconds)
 
-        return all(p in preds for p in preconds) and all(p for p in num_preconds)
+    def is_applicable(self, action):
+        """
+        Checks the preconditions of a grounded action,
+        using the parts precomputed at grounding time
+        """
+        if not action.pos_preconditions <= self.predicates:
+            return False
+        if action.neg_preconditions and not self.predicates.isdisjoint(action.neg_preconditions):
+            return False
+        if action.num_preconditions:
+            functions = self.functions
+            return all(condition(functions) for condition in action.num_preconditions)
+        return True
+
+    def successor(self, action, monotone=False):
+        """
+        Returns the state produced by applying the action, without
+        path information (cost 0, no predecessor).
+        If monotone, ignore the delete list (for A* heuristic)
+        """
+        new_preds = self.predicates | action.add_effects
+        if not monotone:
+            new_preds -= action.del_effects
+        if action.num_effects:
+            new_functions = dict(self.functions)
+            for function, value in action.num_effects:
+                new_functions[function] += value
+            new_preds = set(pre for pre in new_preds if pre[0] != "=")
+            new_preds |= set(('=', function, value) for function, value in new_functions.items())
+
+        return State(new_preds)
 
     def apply(self, action, monotone=False):
         """
         Apply the action to this state to produce a new state.
         If monotone, ignore the delete list (for A* heuristic)
         """
-        new_preds = set([pre for pre in self.predicates if pre[0] != "="])
-        num_preds = set(self.predicates) - new_preds
-        new_functions = {func: num for _, func, num in num_preds}
-
-        add_effects = [effect for effect in action.effects if effect[0] not in [-1, "+=", "-="]]
-        del_effects =   [effect[1] for effect in action.effects if effect[0] == -1]
-        num_effects =   [(effect[1], effect[2]) for effect in action.effects if effect[0] == "+="] +\
-                        [(effect[1], -effect[2]) for effect in action.effects if effect[0] == "-="]
-
-        assert len(action.effects) == len(add_effects + del_effects + num_effects)
-        
-        new_preds |= set(add_effects)
-        if not monotone:
-            new_preds -= set(del_effects)
-        for function, value in num_effects:
-            new_functions[function] += value
-        new_preds |= set(('=', function, value) for function, value in new_functions.items())
-
-        return State(new_preds, self.cost + 1, (self, action))
+        state = self.successor(action, monotone)
+        state.cost = self.cost + 1
+        state.predecessor = (self, action)
+        return state
 
     def plan(self):
         """
@@ -145,6 +386,105 @@ class State(object):
     def __lt__(self, other):
         return hash(self) < hash(other)
 
+def _match(pattern, atom, binding, params):
+    """
+    Unifies a lifted predicate with a grounded atom, returning the
+    binding of parameter names extended accordingly (or None if they
+    do not unify); params maps parameter names to their allowed objects
+    """
+    if isinstance(pattern, tuple):
+        if not isinstance(atom, tuple) or len(pattern) != len(atom):
+            return None
+        for p, a in zip(pattern, atom):
+            binding = _match(p, a, binding, params)
+            if binding is None:
+                return None
+        return binding
+    if pattern in params:
+        if pattern in binding:
+            return binding if binding[pattern] == atom else None
+        if atom not in params[pattern]:
+            return None
+        binding = dict(binding)
+        binding[pattern] = atom
+        return binding
+    return binding if pattern == atom else None
+
+def _key(atom):
+    """Key of the atoms a precondition can match: its symbol and length"""
+    return atom[0], len(atom)
+
+def _positive(action):
+    """Returns the positive, non-numeric preconditions of an action schema"""
+    return [pre for pre in action.preconditions
+            if pre[0] not in NUM_OPS and pre[0] != -1]
+
+def _bindings(action, objects, candidates, first=0):
+    """
+    Yields the parameter tuples of an action schema whose positive
+    preconditions all match atoms, with candidates(i) the atoms the i-th
+    positive precondition may match; the first-th one is matched first
+    """
+    params = {name: set(objects[t]) for t, name in zip(action.types, action.arg_names)}
+    preconditions = _positive(action)
+    order = list(range(len(preconditions)))
+    if order:
+        order.insert(0, order.pop(first))
+
+    def _extend(n, binding):
+        if n == len(order):
+            free = [name for name in action.arg_names if name not in binding]
+            for values in product(*[objects[t] for t, name in zip(action.types, action.arg_names)
+                                    if name not in binding]):
+                full = dict(binding)
+                full.update(zip(free, values))
+                yield tuple(full[name] for name in action.arg_names)
+            return
+        i = order[n]
+        for atom in candidates(i):
+            extended = _match(preconditions[i], atom, binding, params)
+            if extended is not None:
+                yield from _extend(n + 1, extended)
+
+    return _extend(0, dict())
+
+def _symbol(predicate):
+    """
+    Returns the predicate or function symbol changed by an effect,
+    or named by a term
+    """
+    if not isinstance(predicate, tuple):
+        return predicate
+    if predicate[0] == -1:
+        return _symbol(predicate[1])
+    if predicate[0] in ('+=', '-='):
+        return _symbol(predicate[1])
+    return predicate[0]
+
+def _holds(predicate, atoms, functions):
+    """
+    Evaluates a grounded precondition given a set of atoms
+    and a dictionary of function values
+    """
+    if predicate[0] == -1:
+        return predicate[1] not in atoms
+    if predicate[0] in NUM_OPS:
+        return _num_condition(*predicate)(functions)
+    return predicate in atoms
+
+def _num_condition(op, x, y):
+    """
+    Returns a closure evaluating the grounded numeric condition (op x y)
+    on a dictionary of function values
+    """
+    compare = NUM_OPS[op]
+    x_const = type(x) == int
+    y_const = type(y) == int
+    def _condition(functions):
+        return compare(x if x_const else functions.get(x, x),
+                       y if y_const else functions.get(y, y))
+    return _condition
+
 def neg(effect):
     """
     Makes the given effect a negative (delete) effect, like 'not' in PDDL.
@@ -227,10 +567,32 @@ class _GroundedAction(object):
 
         # Ground Action Signature
         self.sig = ground((self.name,) + action.arg_names)
+        # Position in Problem.grounded_actions, set by the Problem
+        self.index = None
 
         # Ground Preconditions, Effects
         self.preconditions = [ground(pre) for pre in action.preconditions]
         self.effects = [ground(effect) for effect in action.effects]
+        self.precompute()
+
+    def precompute(self):
+        """
+        Split preconditions and effects once, for use during search
+        (called again if the preconditions are changed)
+        """
+        self.pos_preconditions = frozenset(pre for pre in self.preconditions
+                                           if pre[0] not in NUM_OPS and pre[0] != -1)
+        self.neg_preconditions = frozenset(pre[1] for pre in self.preconditions if pre[0] == -1)
+        self.num_preconditions = tuple(_num_condition(*pre) for pre in self.preconditions
+                                       if pre[0] in NUM_OPS)
+        self.add_effects = frozenset(effect for effect in self.effects
+                                     if effect[0] not in (-1, "+=", "-="))
+        self.del_effects = frozenset(effect[1] for effect in self.effects if effect[0] == -1)
+        self.num_effects = tuple([(effect[1], effect[2]) for effect in self.effects if effect[0] == "+="] +
+                                 [(effect[1], -effect[2]) for effect in self.effects if effect[0] == "-="])
+
+        # Bitmask/vector form of the above, filled in by Task.compile_action
+        self.compiled = None
 
     def __str__(self):
         arglist = ', '.join(map(str, self.sig[1:]))
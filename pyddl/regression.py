@@ -0,0 +1,364 @@
+"""
+Regression (backward) and bidirectional search.
+
+Backward search runs over partial states: pairs (pos, neg) of bitmasks of
+the compiled Task, of the atoms that must hold and of those that must
+not. Regressing a partial state through a grounded action gives the
+partial state from which applying the action reaches it; the action must
+achieve part of it (add an atom of pos, or delete one of neg) and undo
+none of it. Search ends at a partial state that the initial state
+satisfies, and the plan is the regressed actions, reversed.
+
+Regression needs all conditions to be known without looking at a state,
+so it does not support numeric fluents; numeric conditions between
+constants (such as ('!=', 'from', 'to') once grounded) are evaluated
+when setting up the search.
+"""
+from time import perf_counter
+from .pyddl import NUM_OPS
+from .heuristics import RelaxedHeuristic, INF
+from .search import NodeTable, HeapOpenList
+from .successors import SuccessorGenerator
+from .task import PackedState
+
+def _bit_indices(bits):
+    """Yields the indices of the bits set in an int"""
+    while bits:
+        low = bits & -bits
+        yield low.bit_length() - 1
+        bits ^= low
+
+class Regression(object):
+
+    def __init__(self, problem, state0=None):
+        """
+        Indexes the grounded actions of a problem by the atoms they add
+        and delete, for regression over partial states
+        @arg problem : a pyddl Problem without numeric fluents
+        @arg state0 : if given, the state regression searches back to;
+                      partial states requiring two atoms never true
+                      together in states reachable from it are pruned
+                      (see mutexes)
+        """
+        task = problem.compile()
+        self.task = task
+        self.actions = problem.grounded_actions
+        # One (action, pos, neg, add, del) entry per usable action, with
+        # add excluding atoms also deleted (deletes win when applying)
+        self.entries = list()
+        self.adders = dict()
+        self.deleters = dict()
+        for action in self.actions:
+            if action.num_effects:
+                raise Exception("Regression does not support numeric fluents")
+            if not all(self._constant_condition(pre) for pre in action.preconditions
+                       if pre[0] in NUM_OPS):
+                continue
+            compiled = action.compiled
+            if compiled is None:
+                compiled = task.compile_action(action)
+            pos, neg, add, delete = compiled[:4]
+            k = len(self.entries)
+            self.entries.append((action, pos, neg, add & ~delete, delete))
+            for atom in _bit_indices(add & ~delete):
+                self.adders.setdefault(atom, list()).append(k)
+            for atom in _bit_indices(delete):
+                self.deleters.setdefault(atom, list()).append(k)
+        self.pairs = None
+        if state0 is not None:
+            self.pairs = self.mutexes(self.bits(state0))
+
+    def mutexes(self, bits0):
+        """
+        Returns, by atom id, the bitmask of the atoms that may be true
+        together with it (itself included, if it may be true at all) in
+        states reachable from the state bitmask bits0: the atom pairs
+        reachable when only pairs of atoms are tracked (as for h^2),
+        ignoring negative preconditions. Pairs missing from them are
+        mutexes, never true together
+        """
+        pairs = [0] * len(self.task.atoms)
+        for atom in _bit_indices(bits0):
+            pairs[atom] = bits0
+        reachable = bits0
+        changed = True
+        while changed:
+            changed = False
+            for _, pre_pos, _, add, delete in self.entries:
+                # Atoms true together with all preconditions, which stay
+                # true with the added atoms
+                kept = reachable
+                for atom in _bit_indices(pre_pos):
+                    kept &= pairs[atom]
+                    if kept & pre_pos != pre_pos:
+                        break
+                if kept & pre_pos != pre_pos:
+                    continue
+                kept &= ~(add | delete)
+                for atom in _bit_indices(add):
+                    new = (add | kept) & ~pairs[atom]
+                    if not new:
+                        continue
+                    changed = True
+                    pairs[atom] |= new
+                    for other in _bit_indices(new & ~(1 << atom)):
+                        pairs[other] |= 1 << atom
+                reachable |= add
+        return pairs
+
+    def consistent(self, pos):
+        """
+        Checks whether the atoms of a bitmask may be true together, if
+        mutexes were found (see __init__)
+        """
+        pairs = self.pairs
+        if pairs is None:
+            return True
+        for atom in _bit_indices(pos):
+            # Atoms interned since (such as goals no action adds) are unreachable
+            if atom >= len(pairs) or pairs[atom] & pos != pos:
+                return False
+        return True
+
+    @staticmethod
+    def _constant_condition(condition):
+        """Evaluates a numeric condition between constants"""
+        op, x, y = condition
+        if isinstance(x, tuple) or isinstance(y, tuple):
+            raise Exception("Regression does not support numeric fluents")
+        return NUM_OPS[op](x, y)
+
+    def partial_state(self, goal):
+        """Returns the partial state of a grounded goal pseudo-action"""
+        if any(pre[0] in NUM_OPS and not self._constant_condition(pre)
+               for pre in goal.preconditions):
+            return None
+        pos, neg, _ = self.task.condition([pre for pre in goal.preconditions
+                                           if pre[0] not in NUM_OPS])
+        if pos & neg or not self.consistent(pos):
+            return None
+        return pos, neg
+
+    def bits(self, state):
+        """Returns the atom bitmask of a State or PackedState"""
+        bits = getattr(state, 'bits', None)
+        if bits is None:
+            bits = self.task.encode(p for p in state.predicates if p[0] != '=')
+        return bits
+
+    @staticmethod
+    def satisfies(bits, partial):
+        """Checks whether a state bitmask satisfies a partial state"""
+        pos, neg = partial
+        return bits & pos == pos and not bits & neg
+
+    def regress(self, partial):
+        """
+        Returns the list of (action, partial state) pairs of the actions
+        relevant to and consistent with a partial state, with the partial
+        state regressed through each
+        """
+        pos, neg = partial
+        candidates = set()
+        for atom in _bit_indices(pos):
+            candidates.update(self.adders.get(atom, ()))
+        for atom in _bit_indices(neg):
+            candidates.update(self.deleters.get(atom, ()))
+        result = list()
+        for k in sorted(candidates):
+            action, pre_pos, pre_neg, add, delete = self.entries[k]
+            if delete & pos or add & neg:
+                continue
+            new_pos = (pos & ~add) | pre_pos
+            new_neg = (neg & ~delete) | pre_neg
+            if new_pos & new_neg or not self.consistent(new_pos):
+                continue
+            result.append((action, (new_pos, new_neg)))
+        return result
+
+def regression_search(problem, state0, goal, budget, statistics):
+    """
+    A* search backwards from the goal to state0, with h the largest
+    h_max cost from state0 of the atoms of a partial state (admissible,
+    so the plan is optimal); see planner()
+    """
+    regression = Regression(problem, state0)
+    actions = problem.grounded_actions
+    root_partial = regression.partial_state(goal)
+    if root_partial is None:
+        return None
+    bits0 = regression.bits(state0)
+    start = perf_counter()
+    costs = RelaxedHeuristic(problem, max).atom_costs(state0)
+    heuristic_time = perf_counter() - start
+    def heuristic(partial):
+        return max([costs[atom] for atom in _bit_indices(partial[0])] + [0])
+
+    generated = duplicates = peak_open = 0
+    evaluations = 1
+    next_check = budget.start() if budget is not None else INF
+    exhausted = None
+    table = NodeTable()
+    fringe = HeapOpenList()
+    root, _ = table.insert(root_partial, 0)
+    h = heuristic(root_partial)
+    if h < INF:
+        fringe.push(h, 0, h, (root, 0))
+    states_explored = 0
+    plan = None
+    while len(fringe):
+        if len(fringe) > peak_open:
+            peak_open = len(fringe)
+        i, g = fringe.pop()
+        if table.closed[i] or g != table.g[i]:
+            continue
+        if states_explored >= next_check:
+            exhausted = budget.exhausted(states_explored)
+            if exhausted is not None:
+                break
+            next_check = budget.next_check(states_explored)
+        table.closed[i] = 1
+        states_explored += 1
+        partial = table.states[i]
+        if regression.satisfies(bits0, partial):
+            plan = table.plan(i, actions)
+            plan.reverse()
+            break
+        for action, regressed in regression.regress(partial):
+            generated += 1
+            j, improved = table.insert(regressed, g + 1, i, action.index)
+            if not improved:
+                duplicates += 1
+                continue
+            start = perf_counter()
+            h = heuristic(regressed)
+            heuristic_time += perf_counter() - start
+            evaluations += 1
+            if h < INF:
+                fringe.push(g + 1 + h, g + 1, h, (j, g + 1))
+
+    statistics.expanded = states_explored
+    statistics.generated = generated
+    statistics.duplicates = duplicates
+    statistics.peak_open = peak_open
+    statistics.peak_closed = states_explored
+    statistics.evaluations = evaluations
+    statistics.heuristic_time = heuristic_time
+    statistics.exhausted = exhausted
+    return plan
+
+def bidirectional_search(problem, state0, goal, monotone, budget, statistics):
+    """
+    Breadth-first search forwards from state0 and backwards from the goal,
+    expanding a whole layer of the smaller frontier at a time, until a
+    forward state satisfies a backward partial state; the shortest plan
+    through the meetings found in that layer is optimal. See planner()
+    """
+    regression = Regression(problem, state0)
+    task = regression.task
+    actions = problem.grounded_actions
+    root_partial = regression.partial_state(goal)
+    if root_partial is None:
+        return None
+    if problem.compiled:
+        successor_generator = problem.successor_generator()
+    else:
+        successor_generator = SuccessorGenerator(actions, task)
+    satisfies = regression.satisfies
+
+    generated = duplicates = states_explored = peak_open = 0
+    next_check = budget.start() if budget is not None else INF
+    exhausted = None
+
+    forward = NodeTable()
+    backward = NodeTable()
+    # Forward states by each of their atoms, and backward partial states
+    # by one of their atoms (-1 for those without atoms), to find meetings
+    forward_by_atom = dict()
+    backward_by_atom = dict()
+    meetings = list()
+
+    def _add_forward(i):
+        bits = forward.states[i].bits
+        for atom in _bit_indices(bits):
+            forward_by_atom.setdefault(atom, list()).append(i)
+        for key in [-1] + list(_bit_indices(bits)):
+            for j in backward_by_atom.get(key, ()):
+                if satisfies(bits, backward.states[j]):
+                    meetings.append((forward.g[i] + backward.g[j], i, j))
+
+    def _add_backward(j):
+        partial = backward.states[j]
+        pos = partial[0]
+        key = (pos & -pos).bit_length() - 1
+        backward_by_atom.setdefault(key, list()).append(j)
+        if key == -1:
+            candidates = range(len(forward))
+        else:
+            candidates = forward_by_atom.get(key, ())
+        for i in candidates:
+            if satisfies(forward.states[i].bits, partial):
+                meetings.append((forward.g[i] + backward.g[j], i, j))
+
+    # Forward states are always PackedStates, to be matched with bitmasks
+    if not isinstance(state0, PackedState):
+        state0 = PackedState(task, regression.bits(state0))
+    root, _ = forward.insert(state0, 0)
+    _add_forward(root)
+    back_root, _ = backward.insert(root_partial, 0)
+    _add_backward(back_root)
+    forward_layer = [root]
+    backward_layer = [back_root]
+
+    # Once either side is exhausted, every meeting has been checked: the
+    # other side's new nodes would only meet nodes known already
+    while not meetings and forward_layer and backward_layer:
+        peak_open = max(peak_open, len(forward_layer) + len(backward_layer))
+        expand_forward = len(forward_layer) <= len(backward_layer)
+        next_layer = list()
+        for i in (forward_layer if expand_forward else backward_layer):
+            if states_explored >= next_check:
+                exhausted = budget.exhausted(states_explored)
+                if exhausted is not None:
+                    break
+                next_check = budget.next_check(states_explored)
+            states_explored += 1
+            if expand_forward:
+                state = forward.states[i]
+                for action in successor_generator.applicable(state):
+                    generated += 1
+                    j, added = forward.insert(state.successor(action, monotone),
+                                              forward.g[i] + 1, i, action.index)
+                    if not added:
+                        duplicates += 1
+                        continue
+                    next_layer.append(j)
+                    _add_forward(j)
+            else:
+                for action, regressed in regression.regress(backward.states[i]):
+                    generated += 1
+                    j, added = backward.insert(regressed, backward.g[i] + 1, i, action.index)
+                    if not added:
+                        duplicates += 1
+                        continue
+                    next_layer.append(j)
+                    _add_backward(j)
+        if exhausted is not None:
+            break
+        if expand_forward:
+            forward_layer = next_layer
+        else:
+            backward_layer = next_layer
+
+    statistics.expanded = states_explored
+    statistics.generated = generated
+    statistics.duplicates = duplicates
+    statistics.peak_open = peak_open
+    statistics.peak_closed = len(forward) + len(backward)
+    statistics.exhausted = exhausted
+    if exhausted is not None or not meetings:
+        return None
+    _, i, j = min(meetings)
+    suffix = backward.plan(j, actions)
+    suffix.reverse()
+    return forward.plan(i, actions) + suffix
@@ -0,0 +1,251 @@
+"""
+Search bookkeeping kept apart from states.
+
+Each distinct state reached by a search gets one node, identified by its
+index; the path cost, parent node index and action index of every node
+are stored in flat arrays rather than in the state objects themselves.
+
+Open lists order the nodes waiting for expansion; they share the
+interface push(f, g, h, item), pop() and len().
+"""
+from array import array
+from collections import deque
+from itertools import count
+from time import time
+import heapq
+import os
+import sys
+
+class SearchNode(object):
+    """A read-only view of one entry of a NodeTable"""
+    __slots__ = ('state', 'g', 'parent', 'action')
+
+    def __init__(self, state, g, parent, action):
+        """
+        @arg state : state id (index in NodeTable.states)
+        @arg g : cost of the best path found to the state
+        @arg parent : index of the parent node (-1 for the root)
+        @arg action : index of the action reaching the state (-1 for the root)
+        """
+        self.state = state
+        self.g = g
+        self.parent = parent
+        self.action = action
+
+class NodeTable(object):
+
+    def __init__(self):
+        """Array-backed table of search nodes, one per distinct state"""
+        self.states = list()
+        self.ids = dict()
+        self.g = array('l')
+        self.parent = array('l')
+        self.action = array('l')
+        self.closed = bytearray()
+
+    def insert(self, state, g, parent=-1, action=-1):
+        """
+        Returns the index of the node of the state, adding it if the state
+        is new, or updating its path if g improves on it (unless closed),
+        and whether a node was added or updated
+        """
+        i = self.ids.get(state)
+        if i is None:
+            i = self.ids[state] = len(self.states)
+            self.states.append(state)
+            self.g.append(g)
+            self.parent.append(parent)
+            self.action.append(action)
+            self.closed.append(0)
+            return i, True
+        if g < self.g[i] and not self.closed[i]:
+            self.g[i] = g
+            self.parent[i] = parent
+            self.action[i] = action
+            return i, True
+        return i, False
+
+    def plan(self, i, actions):
+        """
+        Follow parent indices from node i to the root
+        to produce a plan, given the list of actions
+        """
+        plan = list()
+        while self.parent[i] != -1:
+            plan.append(actions[self.action[i]])
+            i = self.parent[i]
+        plan.reverse()
+        return plan
+
+    def __getitem__(self, i):
+        return SearchNode(i, self.g[i], self.parent[i], self.action[i])
+
+    def __len__(self):
+        return len(self.states)
+
+class HeapOpenList(object):
+    """
+    Binary heap open list: lowest f first, then highest g,
+    then first pushed
+    """
+
+    def __init__(self):
+        self.heap = list()
+        self.counter = count()
+
+    def push(self, f, g, h, item):
+        heapq.heappush(self.heap, (f, -g, next(self.counter), item))
+
+    def pop(self):
+        return heapq.heappop(self.heap)[3]
+
+    def __len__(self):
+        return len(self.heap)
+
+class BucketOpenList(object):
+    """
+    Open list of buckets of items with equal f (and equal h, for 'low-h'),
+    with constant time push and pop while f takes few distinct values,
+    as with unit action costs. Ties are broken by tie_breaking:
+    'lifo'  - last pushed first
+    'fifo'  - first pushed first
+    'low-h' - lowest h first, then last pushed first
+    """
+
+    def __init__(self, tie_breaking='low-h'):
+        if tie_breaking not in ('lifo', 'fifo', 'low-h'):
+            raise Exception(f"Invalid tie breaking : {tie_breaking}")
+        self.by_h = tie_breaking == 'low-h'
+        self.fifo = tie_breaking == 'fifo'
+        self.buckets = dict()
+        self.min_key = None
+        self.size = 0
+
+    def push(self, f, g, h, item):
+        key = (f, h) if self.by_h else f
+        bucket = self.buckets.get(key)
+        if bucket is None:
+            bucket = self.buckets[key] = deque()
+            if self.min_key is None or key < self.min_key:
+                self.min_key = key
+        bucket.append(item)
+        self.size += 1
+
+    def pop(self):
+        bucket = self.buckets[self.min_key]
+        item = bucket.popleft() if self.fifo else bucket.pop()
+        self.size -= 1
+        if not bucket:
+            # Only scanned when a bucket runs out, and there are few
+            del self.buckets[self.min_key]
+            self.min_key = min(self.buckets) if self.buckets else None
+        return item
+
+    def __len__(self):
+        return self.size
+
+class SearchStatistics(object):
+    """
+    Counters of a search, filled in by planner() (see its statistics
+    argument) when the search ends:
+    expanded       - states expanded
+    generated      - successors generated
+    duplicates     - successors pruned, as reached before at no higher cost
+    reopened       - expanded states reached again by a cheaper path
+    peak_open      - largest number of states waiting for expansion
+    peak_closed    - largest number of states kept as expanded
+    evaluations    - heuristic evaluations
+    heuristic_time - seconds spent evaluating the heuristic
+    ground_time    - seconds spent grounding, compiling and indexing
+                     the problem (see Problem.ground_time)
+    search_time    - seconds spent searching
+    plan_length    - length of the plan found (None if there is none)
+    exhausted      - the budget that stopped the search ('deadline',
+                     'expansions' or 'memory'), or None
+    bound          - for 'anytime' search, an upper bound on the ratio of
+                     the plan length to the optimal one (None otherwise)
+    """
+    FIELDS = ('expanded', 'generated', 'duplicates', 'reopened', 'peak_open',
+              'peak_closed', 'evaluations', 'heuristic_time', 'ground_time',
+              'search_time', 'plan_length', 'exhausted', 'bound')
+
+    def __init__(self):
+        for field in self.FIELDS:
+            setattr(self, field, 0)
+        self.plan_length = None
+        self.exhausted = None
+        self.bound = None
+
+    @property
+    def expansions_per_sec(self):
+        return self.expanded / self.search_time if self.search_time else 0.0
+
+    def as_dict(self):
+        """The statistics as a dict, e.g. to be logged as JSON"""
+        return {field: getattr(self, field) for field in self.FIELDS}
+
+    def __str__(self):
+        return ', '.join('%s=%s' % (field, getattr(self, field)) for field in self.FIELDS)
+
+class SearchBudget(object):
+    """
+    Limits on a search, checked every CHECK_INTERVAL expansions (and
+    exactly for max_expansions)
+    """
+    CHECK_INTERVAL = 64
+
+    def __init__(self, deadline=None, max_expansions=None, max_memory=None):
+        """
+        @arg deadline : seconds the search may run for
+        @arg max_expansions : number of states the search may expand
+        @arg max_memory : resident memory of the process, in bytes
+        """
+        self.deadline = deadline
+        self.max_expansions = max_expansions
+        self.max_memory = max_memory
+        self.end = None
+
+    def start(self):
+        """
+        Starts the clock of the deadline; returns the first check point,
+        before any expansion
+        """
+        if self.deadline is not None:
+            self.end = time() + self.deadline
+        return 0
+
+    def next_check(self, expanded):
+        """Number of expansions at which exhausted() is next checked"""
+        if self.max_expansions is not None:
+            return min(expanded + self.CHECK_INTERVAL, self.max_expansions)
+        return expanded + self.CHECK_INTERVAL
+
+    def exhausted(self, expanded):
+        """Returns the name of the budget exhausted after expanded states, if any"""
+        if self.max_expansions is not None and expanded >= self.max_expansions:
+            return 'expansions'
+        if self.end is not None and time() >= self.end:
+            return 'deadline'
+        if self.max_memory is not None and current_memory() >= self.max_memory:
+            return 'memory'
+        return None
+
+def peak_memory():
+    """Returns the peak resident memory of the process in bytes"""
+    import resource
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in kilobytes, except on macOS
+    if sys.platform != 'darwin':
+        peak *= 1024
+    return peak
+
+def current_memory():
+    """
+    Returns the resident memory of the process in bytes, from /proc where
+    available, else its peak resident memory (which never decreases)
+    """
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError):
+        return peak_memory()
@@ -0,0 +1,95 @@
+"""
+Successor generator for grounded actions.
+
+Grounded actions are arranged in a decision tree keyed on their positive
+precondition atoms, so that finding the actions applicable in a state only
+visits the branches whose atoms hold, instead of testing every action.
+"""
+
+class _Node(object):
+    """A node of the successor generator decision tree"""
+    __slots__ = ('key', 'true', 'dont_care', 'actions', 'checked')
+
+    def __init__(self):
+        self.key = None        # atom (or bitmask) tested at this node
+        self.true = None       # subtree of actions requiring the atom
+        self.dont_care = None  # subtree of actions not mentioning it
+        self.actions = list()  # actions whose preconditions are all tested
+        self.checked = list()  # same, but with negative/numeric preconditions
+
+class SuccessorGenerator(object):
+
+    def __init__(self, actions, task=None):
+        """
+        Builds the decision tree for a list of grounded actions
+        @arg actions : list of _GroundedAction objects
+        @arg task : if given, a compiled Task; the tree then tests
+                    atom bitmasks of PackedStates instead of predicates
+        """
+        self.task = task
+
+        # Test frequent atoms first so that the tree stays shallow
+        counts = dict()
+        for action in actions:
+            for atom in action.pos_preconditions:
+                counts[atom] = counts.get(atom, 0) + 1
+        atoms = sorted(counts, key=lambda atom: -counts[atom])
+        rank = {atom: i for i, atom in enumerate(atoms)}
+        if task is None:
+            keys = atoms
+        else:
+            keys = [1 << task.intern(atom) for atom in atoms]
+
+        # Each entry is (action, sorted precondition ranks, ranks tested so far)
+        entries = [(action, sorted(rank[atom] for atom in action.pos_preconditions), 0)
+                   for action in actions]
+        self.root = _Node()
+        stack = [(self.root, entries)]
+        while stack:
+            node, entries = stack.pop()
+            rest = list()
+            for entry in entries:
+                action, pre, i = entry
+                if i == len(pre):
+                    if action.neg_preconditions or action.num_preconditions:
+                        node.checked.append(action)
+                    else:
+                        node.actions.append(action)
+                else:
+                    rest.append(entry)
+            if not rest:
+                continue
+            # Entries whose next atom is the first in the ordering consume
+            # it; the remaining ones are passed down unchanged
+            first = min(pre[i] for _, pre, i in rest)
+            node.key = keys[first]
+            node.true = _Node()
+            stack.append((node.true, [(a, pre, i + 1) for a, pre, i in rest if pre[i] == first]))
+            dont_care = [entry for entry in rest if entry[1][entry[2]] != first]
+            if dont_care:
+                node.dont_care = _Node()
+                stack.append((node.dont_care, dont_care))
+
+    def applicable(self, state):
+        """Returns the list of actions applicable in the given state"""
+        if self.task is None:
+            facts = state.predicates
+            holds = facts.__contains__
+        else:
+            bits = state.bits
+            holds = lambda mask: bits & mask
+        result = list()
+        stack = [self.root]
+        while stack:
+            node = stack.pop()
+            if node.actions:
+                result.extend(node.actions)
+            for action in node.checked:
+                if state.is_applicable(action):
+                    result.append(action)
+            if node.key is not None:
+                if node.dont_care is not None:
+                    stack.append(node.dont_care)
+                if holds(node.key):
+                    stack.append(node.true)
+        return result
@@ -0,0 +1,305 @@
+"""
+Compiled representation of a grounded Problem.
+
+Every grounded atom is interned to an integer id, so that the
+propositional part of a state is a single int bitmask and
+preconditions/effects are checked and applied with bitwise operations.
+Numeric functions are likewise interned, and their values stored as a
+fixed-order tuple. The tuple form of a state is only reconstructed for
+printing.
+
+States are hashed incrementally (Zobrist hashing): every atom has a
+random 64-bit key, the hash of a state is the XOR of the keys of its true
+atoms, and a successor's hash is derived from its parent's by XORing the
+keys of the atoms the action changed.
+"""
+from operator import add
+import random
+from .pyddl import NUM_OPS
+
+class Task(object):
+
+    def __init__(self, problem, atoms=None):
+        """
+        Interns the atoms of a grounded problem
+        @arg problem : a pyddl Problem
+        @arg atoms : if given, the atoms of a Task of the same grounded
+                     actions, already compiled with them (as loaded from
+                     the grounding cache, see cache.py)
+        """
+        self.atoms = list()
+        self.atom_ids = dict()
+        # Zobrist keys of the atoms, from a fixed seed so that every
+        # process compiling the same problem hashes states alike
+        self.keys = list()
+        self._random = random.Random(0)
+
+        # Atoms of the actions are interned before those of init, in the
+        # order of the actions, so that compiled actions do not depend on init
+        if atoms is None:
+            for action in problem.grounded_actions:
+                for pre in action.preconditions:
+                    if pre[0] == -1:
+                        self.intern(pre[1])
+                    elif pre[0] not in NUM_OPS:
+                        self.intern(pre)
+                for effect in action.effects:
+                    if effect[0] == -1:
+                        self.intern(effect[1])
+                    elif effect[0] not in ('+=', '-='):
+                        self.intern(effect)
+        else:
+            for atom in atoms:
+                self.intern(atom)
+
+        self.init = 0
+        values = dict()
+        for predicate in problem.init:
+            if predicate[0] == '=':
+                values[predicate[1]] = predicate[2]
+            else:
+                self.init |= 1 << self.intern(predicate)
+
+        # Functions are those given a value in init or changed by an
+        # effect (starting from 0), in a fixed order
+        self.functions = list(values)
+        for action in problem.grounded_actions:
+            for function, _ in action.num_effects:
+                if function not in values:
+                    values[function] = 0
+                    self.functions.append(function)
+        self.function_ids = {f: i for i, f in enumerate(self.functions)}
+        self.init_fluents = tuple(values[f] for f in self.functions)
+
+        # Numeric conditions and effects depend on the functions, so
+        # loaded actions with some are compiled again
+        for action in problem.grounded_actions:
+            if atoms is None or action.num_preconditions or action.num_effects:
+                self.compile_action(action)
+
+    def intern(self, atom):
+        """Returns the integer id of the atom, assigning a new one if needed"""
+        atom_id = self.atom_ids.get(atom)
+        if atom_id is None:
+            atom_id = len(self.atoms)
+            self.atom_ids[atom] = atom_id
+            self.atoms.append(atom)
+            self.keys.append(self._random.getrandbits(64))
+        return atom_id
+
+    def zobrist(self, bits):
+        """Returns the XOR of the Zobrist keys of the atoms set in bits"""
+        keys = self.keys
+        zobrist = 0
+        while bits:
+            low = bits & -bits
+            zobrist ^= keys[low.bit_length() - 1]
+            bits ^= low
+        return zobrist
+
+    def encode(self, atoms):
+        """Returns the bitmask of a collection of atoms"""
+        bits = 0
+        for atom in atoms:
+            bits |= 1 << self.intern(atom)
+        return bits
+
+    def decode(self, bits):
+        """Returns the list of atoms set in the bitmask"""
+        atoms = list()
+        while bits:
+            low = bits & -bits
+            atoms.append(self.atoms[low.bit_length() - 1])
+            bits ^= low
+        return atoms
+
+    def num_condition(self, op, x, y):
+        """
+        Returns a closure evaluating the grounded numeric condition (op x y)
+        on a tuple of function values, with functions looked up by index
+        """
+        compare = NUM_OPS[op]
+        i = self.function_ids.get(x) if type(x) != int else None
+        j = self.function_ids.get(y) if type(y) != int else None
+        if i is not None and j is not None:
+            return lambda values: compare(values[i], values[j])
+        if i is not None:
+            return lambda values: compare(values[i], y)
+        if j is not None:
+            return lambda values: compare(x, values[j])
+        result = compare(x, y)
+        return lambda values: result
+
+    def condition(self, preconditions):
+        """
+        Returns the compiled form (pos_mask, neg_mask, num_conditions)
+        of a tuple of preconditions
+        """
+        pos = self.encode(p for p in preconditions
+                          if p[0] not in NUM_OPS and p[0] != -1)
+        neg = self.encode(p[1] for p in preconditions if p[0] == -1)
+        num = tuple(self.num_condition(*p) for p in preconditions if p[0] in NUM_OPS)
+        return pos, neg, num
+
+    def compile_action(self, action):
+        """
+        Sets action.compiled to (pos_mask, neg_mask, add_mask, del_mask,
+        num_conditions, delta): the bitmasks of its precomputed preconditions
+        and effects, closures evaluating its numeric preconditions on
+        function value tuples, and the vector of its numeric effects
+        (None if it has none)
+        """
+        pos, neg, num = self.condition(action.preconditions)
+        delta = None
+        if action.num_effects:
+            delta = [0] * len(self.functions)
+            for function, value in action.num_effects:
+                delta[self.function_ids[function]] += value
+            delta = tuple(delta)
+        action.compiled = (pos, neg,
+                           self.encode(action.add_effects),
+                           self.encode(action.del_effects),
+                           num, delta)
+        return action.compiled
+
+    def initial_state(self):
+        return PackedState(self, self.init, self.init_fluents)
+
+    def state(self, predicates):
+        """
+        Returns the PackedState of a tuple of predicates and function
+        values, such as the init of a Problem variant (functions not
+        given a value start from 0)
+        """
+        bits = 0
+        fluents = [0] * len(self.functions)
+        for predicate in predicates:
+            if predicate[0] == '=':
+                i = self.function_ids.get(predicate[1])
+                if i is None:
+                    raise Exception(f"Unknown function : {predicate[1]}")
+                fluents[i] = predicate[2]
+            else:
+                bits |= 1 << self.intern(predicate)
+        return PackedState(self, bits, tuple(fluents))
+
+class PackedState(object):
+    """
+    A state of a compiled Task, interchangeable with State during search
+    """
+    __slots__ = ('task', 'bits', 'fluents', 'zobrist', 'cost', 'predecessor')
+
+    def __init__(self, task, bits, fluents=(), cost=0, predecessor=None, zobrist=None):
+        """
+        @arg task : the compiled Task this state belongs to
+        @arg bits : bitmask of the true atoms
+        @arg fluents : tuple of function values, in the order of task.functions
+        @arg zobrist : Zobrist hash of bits, if already known
+        """
+        self.task = task
+        self.bits = bits
+        self.fluents = fluents
+        self.cost = cost
+        self.predecessor = predecessor
+        self.zobrist = task.zobrist(bits) if zobrist is None else zobrist
+
+    @property
+    def key(self):
+        """Hashable value identifying the state, however it was reached"""
+        return (self.bits, self.fluents)
+
+    @property
+    def predicates(self):
+        """The tuple form of the state, as stored by State"""
+        return frozenset(self.task.decode(self.bits)) | \
+            frozenset(('=', func, num) for func, num in zip(self.task.functions, self.fluents))
+
+    def is_true(self, preconditions):
+        pos, neg, num = self.task.condition(preconditions)
+        bits = self.bits
+        if bits & pos != pos or bits & neg:
+            return False
+        fluents = self.fluents
+        return all(condition(fluents) for condition in num)
+
+    def is_applicable(self, action):
+        """
+        Checks the preconditions of a grounded action
+        against the bitmasks compiled for it
+        """
+        compiled = action.compiled
+        if compiled is None:
+            compiled = self.task.compile_action(action)
+        pos, neg = compiled[0], compiled[1]
+        bits = self.bits
+        if bits & pos != pos or bits & neg:
+            return False
+        if compiled[4]:
+            fluents = self.fluents
+            return all(condition(fluents) for condition in compiled[4])
+        return True
+
+    def successor(self, action, monotone=False):
+        """
+        Returns the state produced by applying the action, without
+        path information (cost 0, no predecessor).
+        If monotone, ignore the delete list (for A* heuristic)
+        """
+        compiled = action.compiled
+        if compiled is None:
+            compiled = self.task.compile_action(action)
+        bits = self.bits | compiled[2]
+        if not monotone:
+            bits &= ~compiled[3]
+        fluents = self.fluents
+        if compiled[5] is not None:
+            fluents = tuple(map(add, fluents, compiled[5]))
+
+        # Update the hash with the keys of the atoms that changed
+        zobrist = self.zobrist
+        changed = self.bits ^ bits
+        if changed:
+            keys = self.task.keys
+            while changed:
+                low = changed & -changed
+                zobrist ^= keys[low.bit_length() - 1]
+                changed ^= low
+        return PackedState(self.task, bits, fluents, zobrist=zobrist)
+
+    def apply(self, action, monotone=False):
+        """
+        Apply the action to this state to produce a new state.
+        If monotone, ignore the delete list (for A* heuristic)
+        """
+        state = self.successor(action, monotone)
+        state.cost = self.cost + 1
+        state.predecessor = (self, action)
+        return state
+
+    def plan(self):
+        """
+        Follow backpointers to successor states
+        to produce a plan.
+        """
+        plan = list()
+        n = self
+        while n.predecessor is not None:
+            plan.append(n.predecessor[1])
+            n = n.predecessor[0]
+        plan.reverse()
+        return plan
+
+    def __hash__(self):
+        if self.fluents:
+            return self.zobrist ^ hash(self.fluents)
+        return self.zobrist
+
+    def __eq__(self, other):
+        return self.zobrist == other.zobrist and self.bits == other.bits and \
+            self.fluents == other.fluents
+
+    def __str__(self):
+        return 'Predicates:\n%s' % '\n'.join(map(str, self.predicates))
+
+    def __lt__(self, other):
+        return hash(self) < hash(other)
@@ -0,0 +1,41 @@
+import os
+import json
+import pytest
+from pyddl.benchmark import *
+
+@pytest.mark.parametrize('compiled', [False, True])
+def test_n_puzzle_1(compiled):
+    problem = n_puzzle(size=3, moves=6, seed=1, compiled=compiled)
+    h = manhattan_heuristic(problem)
+    assert h(problem.initial_state()) <= 6
+    plan = planner(problem, heuristic=h, verbose=False)
+    assert len(plan) <= 6 and len(plan) % 2 == 0
+    solved = n_puzzle(size=2, moves=0, compiled=compiled)
+    assert planner(solved, verbose=False) == []
+
+def test_generators_1():
+    assert len(planner(missionaries_cannibals(compiled=True), verbose=False)) == 21
+    assert len(planner(butler_story(), verbose=False)) == 4
+    assert len(butler_story(4, 3).grounded_actions) > len(butler_story().grounded_actions)
+
+def test_benchmark_run_1(capsys):
+    result = run_isolated(('butler_story', butler_story, dict(compiled=True), dict()))
+    assert result['plan_length'] == 4
+    assert result['expanded'] > 0 and result['peak_rss_bytes'] > 2**20
+    main(['-k', 'butler_story_6'])
+    lines = capsys.readouterr().out.splitlines()
+    assert [json.loads(line)['name'] for line in lines] == ['butler_story_6x6']
+
+def broken(**kwargs):
+    raise ValueError("broken generator")
+
+def crashing(**kwargs):
+    os._exit(3)
+
+def test_benchmark_errors_1():
+    for timeout in (None, 30):
+        result = run_isolated(('broken', broken, dict(), dict()), timeout)
+        assert result['name'] == 'broken' and 'ValueError' in result['error']
+        assert 'timeout' not in result
+    result = run_isolated(('crashing', crashing, dict(), dict()))
+    assert result['error'] == "exited with code 3"
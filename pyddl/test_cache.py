@@ -0,0 +1,69 @@
+import os
+import pytest
+from pyddl.pyddl import *
+from pyddl.cache import *
+from pyddl.planner import planner
+from pyddl.test_task import butler_problem, counter_problem
+
+def signatures(problem):
+    return [(action.sig, action.preconditions, action.effects)
+            for action in problem.grounded_actions]
+
+@pytest.mark.parametrize('kwargs', [dict(), dict(prune=True), dict(static=True)])
+@pytest.mark.parametrize('make_problem', [butler_problem, counter_problem])
+def test_cached_grounding_1(tmp_path, make_problem, kwargs):
+    problem = make_problem(**kwargs)
+    stored = make_problem(cache_dir=str(tmp_path), **kwargs)
+    assert len(os.listdir(tmp_path)) == 1
+    loaded = make_problem(cache_dir=str(tmp_path), compiled=True, **kwargs)
+    assert len(os.listdir(tmp_path)) == 1
+    assert signatures(stored) == signatures(problem)
+    assert signatures(loaded) == signatures(problem)
+    assert [action.index for action in loaded.grounded_actions] == \
+        list(range(len(problem.grounded_actions)))
+    assert len(planner(loaded, verbose=False)) == len(planner(problem, verbose=False))
+
+def test_grounding_key_1():
+    domain = Domain(())
+    assert grounding_key(domain, {'a': (1, 2)}) == grounding_key(domain, {'a': (1, 2)})
+    assert grounding_key(domain, {'a': (1, 2)}) != grounding_key(domain, {'a': (1, 3)})
+    assert grounding_key(domain, {}, ()) == grounding_key(domain, {}, (('p',),))
+    assert grounding_key(domain, {}, (), prune=True) != \
+        grounding_key(domain, {}, (('p',),), prune=True)
+
+@pytest.mark.parametrize('content', [b'PYDDLGA1', b'not a grounding', None])
+def test_load_grounding_1(tmp_path, content):
+    butler_problem(cache_dir=str(tmp_path))
+    path, = [str(tmp_path / name) for name in os.listdir(tmp_path)]
+    with open(path, 'rb') as f:
+        data = f.read()
+    with open(path, 'wb') as f:
+        # Old format, garbage, or truncated
+        f.write(data[:len(data) // 2] if content is None else content)
+    problem = butler_problem(cache_dir=str(tmp_path))
+    assert signatures(problem) == signatures(butler_problem())
+    assert len(planner(problem, verbose=False)) == len(planner(butler_problem(), verbose=False))
+    # The file was replaced by a valid one
+    assert load_grounding(path)[0]
+
+@pytest.mark.parametrize('compiled', [False, True])
+@pytest.mark.parametrize('make_problem', [butler_problem, counter_problem])
+def test_cached_grounding_compiled_1(tmp_path, make_problem, compiled):
+    problem = make_problem(compiled=compiled)
+    make_problem(cache_dir=str(tmp_path), compiled=not compiled)
+    loaded = make_problem(cache_dir=str(tmp_path), compiled=compiled)
+    assert loaded.compile().atoms == problem.compile().atoms
+    assert [action.compiled[:4] + action.compiled[5:] for action in loaded.grounded_actions] == \
+        [action.compiled[:4] + action.compiled[5:] for action in problem.grounded_actions]
+    state = loaded.initial_state()
+    assert [action.index for action in loaded.successor_generator().applicable(state)] == \
+        [action.index for action in problem.successor_generator().applicable(problem.initial_state())]
+
+def test_cached_grounding_init_1(tmp_path):
+    from pyddl.benchmark import n_puzzle
+    # Stored with another init, which the cache key does not cover
+    n_puzzle(size=2, moves=3, seed=0, cache_dir=str(tmp_path))
+    problem = n_puzzle(size=2, moves=3, seed=1, compiled=True)
+    loaded = n_puzzle(size=2, moves=3, seed=1, compiled=True, cache_dir=str(tmp_path))
+    assert loaded.initial_state().bits == problem.initial_state().bits
+    assert len(planner(loaded, verbose=False)) == len(planner(problem, verbose=False))
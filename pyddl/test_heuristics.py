@@ -0,0 +1,114 @@
+import pytest
+from pyddl.pyddl import *
+from pyddl.heuristics import *
+from pyddl.planner import planner
+from pyddl.test_task import butler_problem
+
+def chain_problem(**kwargs):
+    domain = Domain((
+        Action(
+            'step',
+            parameters=(
+                ('node', 'a'),
+                ('node', 'b'),
+            ),
+            preconditions=(
+                ('edge', 'a', 'b'),
+                ('at', 'a'),
+            ),
+            effects=(
+                neg(('at', 'a')),
+                ('at', 'b'),
+            ),
+        ),
+    ))
+    return Problem(
+        domain,
+        {'node': (1, 2, 3, 4)},
+        init=(
+            ('edge', 1, 2), ('edge', 2, 3), ('edge', 3, 4), ('edge', 1, 3),
+            ('at', 1),
+        ),
+        goal=(
+            ('at', 3),
+            ('at', 4),
+        ),
+        **kwargs
+    )
+
+@pytest.mark.parametrize('compiled', [False, True])
+def test_relaxed_heuristics_1(compiled):
+    problem = chain_problem(compiled=compiled)
+    state = problem.initial_state()
+
+    assert hmax_heuristic(problem)(state) == 2
+    assert hadd_heuristic(problem)(state) == 3
+    assert ff_heuristic(problem)(state) == 2
+
+def test_relaxed_heuristics_2():
+    problem = chain_problem()
+    state = State((('at', 4),) + problem.init[:-1])
+    for make_heuristic in (hmax_heuristic, hadd_heuristic, ff_heuristic):
+        assert make_heuristic(problem)(state) == float('inf')
+
+def test_relaxed_heuristics_goal_1():
+    problem = butler_problem()
+    state = problem.initial_state()
+    for action in planner(problem, verbose=False):
+        state = state.apply(action)
+    for make_heuristic in (hmax_heuristic, hadd_heuristic, ff_heuristic):
+        assert make_heuristic(problem)(state) == 0
+
+def test_ff_preferred_1():
+    problem = chain_problem()
+    h = FFHeuristic(problem, preferred=True)
+    h(problem.initial_state())
+    assert [action.sig for action in h.preferred] == [('step', 1, 3)]
+    # Only found on request
+    h = ff_heuristic(problem)
+    assert h(problem.initial_state()) == FFHeuristic(problem, True)(problem.initial_state())
+    assert h.preferred == []
+
+@pytest.mark.parametrize('name', ['hmax', 'hadd', 'ff'])
+def test_planner_heuristic_name_1(name):
+    problem = butler_problem(compiled=True)
+    plan = planner(problem, heuristic=name, verbose=False)
+    assert [action.name for action in plan] == ['Put-poison', 'Carry', 'Drink', 'Fall-down']
+
+def test_heuristic_cache_1():
+    calls = []
+    def h(state):
+        calls.append(state)
+        return len(state.predicates)
+    cache = HeuristicCache(h, maxsize=2)
+    a, b, c = State((('a',),)), State((('b',), ('c',))), State(())
+
+    assert cache(a) == 1
+    assert cache(State((('a',),), cost=3)) == 1
+    assert (cache.hits, cache.misses) == (1, 1)
+    assert cache(b) == 2
+    assert cache(a) == 1
+    assert cache(c) == 0
+    assert len(cache) == 2
+    assert (cache.hits, cache.misses) == (2, 3)
+    # b was least recently used, so it was evicted
+    assert cache(b) == 2
+    assert len(calls) == 4
+
+def test_cached_heuristic_1():
+    problem = butler_problem()
+    cache = cached_heuristic(problem, 'ff')
+    assert isinstance(cache.heuristic, FFHeuristic)
+    assert cached_heuristic(problem, 'ff') is cache
+    assert cached_heuristic(butler_problem(), 'ff') is not cache
+
+def test_planner_cache_1():
+    problem = butler_problem(compiled=True)
+    plan = planner(problem, heuristic='hadd', verbose=False, cache=True)
+    cache = cached_heuristic(problem, 'hadd')
+    misses = cache.misses
+    assert misses > 0
+
+    assert len(planner(problem, heuristic='hadd', verbose=False, cache=True)) == len(plan)
+    assert cache.misses == misses
+    assert cache.hits > 0
@@ -0,0 +1,66 @@
+import pytest
+from pyddl.pyddl import *
+from pyddl.hooks import *
+from pyddl.planner import planner
+from pyddl.search import SearchStatistics
+from pyddl.test_task import butler_problem
+
+class Recorder(SearchHooks):
+
+    def __init__(self):
+        self.expanded = list()
+        self.generated = 0
+        self.goals = list()
+
+    def on_expand(self, state, g):
+        self.expanded.append(g)
+
+    def on_generate(self, state, action, successor):
+        self.generated += 1
+
+    def on_goal(self, state, plan):
+        self.goals.append(list(plan))
+
+@pytest.mark.parametrize('search', ['astar', 'gbfs', 'idastar'])
+@pytest.mark.parametrize('compiled', [False, True])
+def test_hooks_1(compiled, search):
+    problem = butler_problem(compiled=compiled)
+    hooks = Recorder()
+    statistics = SearchStatistics()
+    plan = planner(problem, heuristic='hmax', verbose=False, search=search,
+                   hooks=hooks, statistics=statistics)
+    assert len(hooks.expanded) == statistics.expanded
+    assert hooks.generated == statistics.generated
+    assert hooks.goals == [plan]
+
+def test_hooks_2():
+    problem = butler_problem()
+    state0 = problem.initial_state()
+    functions = instrument(None, problem, state0, len)
+    assert functions[:3] == (None, None, None)
+    assert functions[3] == problem.successor_generator().applicable
+    assert functions[4] is State.successor and functions[6] is len
+    functions = instrument(SearchHooks(), problem, state0, len)
+    assert functions[:3] == (None, None, None) and functions[6] is len
+    with pytest.raises(Exception):
+        planner(problem, verbose=False, search='hdastar', hooks=Recorder())
+
+def test_action_profiler_1():
+    problem = butler_problem(compiled=True)
+    profiler = ActionProfiler()
+    statistics = SearchStatistics()
+    planner(problem, heuristic='hadd', verbose=False, hooks=profiler,
+            statistics=statistics)
+    assert profiler.expanded == statistics.expanded
+    assert sum(count for _, count, _ in profiler.report()) == statistics.generated
+    assert set(name for name, _, _ in profiler.report()) <= \
+        set(['Put-poison', 'Carry', 'Drink', 'Fall-down'])
+    assert all(profiler.phases[phase] > 0 for phase in PHASES)
+    assert 'Carry' in str(profiler)
+
+def test_hooks_list_1():
+    problem = butler_problem(compiled=True)
+    profilers = [ActionProfiler(), ActionProfiler()]
+    planner(problem, verbose=False, hooks=profilers)
+    assert profilers[0].expanded == profilers[1].expanded > 0
+    assert profilers[0].counts == profilers[1].counts
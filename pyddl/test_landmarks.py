@@ -0,0 +1,104 @@
+import pytest
+from pyddl.pyddl import *
+from pyddl.landmarks import *
+from pyddl.heuristics import INF
+from pyddl.planner import planner
+from pyddl.search import SearchStatistics
+from pyddl.hooks import ActionProfiler
+from pyddl.test_task import butler_problem
+from pyddl.benchmark import butler_story
+
+def follow(problem, heuristic, names):
+    """Applies actions by name from init, tracking accepted landmarks"""
+    actions = {str(action): action for action in problem.grounded_actions}
+    state = problem.initial_state()
+    values = [heuristic(state)]
+    for name in names:
+        successor = state.apply(actions[name])
+        heuristic.on_generate(state, actions[name], successor)
+        state = successor
+        values.append(heuristic(state))
+    return values
+
+@pytest.mark.parametrize('compiled', [False, True])
+def test_landmarks_1(compiled):
+    problem = butler_problem(compiled=compiled)
+    landmarks = Landmarks(problem)
+    atoms = [landmarks.task.atoms[atom] for atom in landmarks.atoms]
+    assert set(atoms) == set([('dead', 'lord'), ('poisoned', 'wine'),
+                              ('drinking', 'lord', 'wine'), ('have', 'lord', 'wine'),
+                              ('have', 'butler', 'wine')])
+    orderings = set((atoms[before], atoms[after]) for before, after in landmarks.orderings)
+    assert (('poisoned', 'wine'), ('dead', 'lord')) in orderings
+    assert (('have', 'lord', 'wine'), ('drinking', 'lord', 'wine')) in orderings
+    assert not landmarks.unsolvable
+
+def test_landmarks_unsolvable_1():
+    problem = butler_problem().variant(goal=(('poisoned', 'poison'),))
+    assert Landmarks(problem).unsolvable
+    assert LandmarkCountHeuristic(problem)(problem.initial_state()) == INF
+
+@pytest.mark.parametrize('compiled', [False, True])
+def test_lmcount_1(compiled):
+    problem = butler_problem(compiled=compiled)
+    plan = ['Put-poison(butler)', 'Carry(butler, wine, lord)', 'Drink(lord, wine)',
+            'Fall-down(lord, wine)']
+    assert follow(problem, LandmarkCountHeuristic(problem), plan) == [4, 3, 2, 1, 0]
+    # Without following the path, only the true landmarks (dead lord,
+    # poisoned wine) are accepted
+    actions = {str(action): action for action in problem.grounded_actions}
+    state = problem.initial_state()
+    for name in plan:
+        state = state.apply(actions[name])
+    assert LandmarkCountHeuristic(problem, dead_ends=False)(state) == 3
+
+@pytest.mark.parametrize('compiled', [False, True])
+def test_lmcount_dead_ends_1(compiled):
+    problem = butler_problem(compiled=compiled)
+    # Once the lord drinks the wine, it can no longer be poisoned
+    stuck = ['Carry(butler, wine, lord)', 'Drink(lord, wine)']
+    assert follow(problem, LandmarkCountHeuristic(problem, dead_ends=False), stuck) == [4, 3, 2]
+    assert follow(problem, LandmarkCountHeuristic(problem), stuck) == [4, 3, INF]
+
+def test_lmcount_planner_1():
+    problem = butler_story(6, 6, compiled=True)
+    statistics = SearchStatistics()
+    plan = planner(problem, heuristic='lmcount', search='gbfs', verbose=False,
+                   statistics=statistics)
+    assert plan is not None and statistics.expanded < 20
+    heuristic = LandmarkCountHeuristic(problem)
+    assert len(planner(problem, heuristic=heuristic, verbose=False)) == \
+        len(planner(problem, heuristic='hmax', verbose=False))
+    # Used as the hooks of the search, to follow accepted landmarks
+    assert len(heuristic.accepted) > 1
+
+def test_lmcount_planner_2():
+    problem = butler_story(6, 6, compiled=True)
+    # Called along with other hooks
+    profiler = ActionProfiler()
+    statistics = SearchStatistics()
+    assert planner(problem, heuristic='lmcount', search='gbfs', verbose=False,
+                   hooks=profiler, statistics=statistics) is not None
+    assert statistics.expanded < 20 and profiler.expanded == statistics.expanded
+    # Path-dependent values cannot be cached, nor followed by hdastar
+    for kwargs in (dict(cache=True), dict(search='hdastar')):
+        with pytest.raises(Exception):
+            planner(problem, heuristic='lmcount', verbose=False, **kwargs)
+        with pytest.raises(Exception):
+            planner(problem, heuristic=LandmarkCountHeuristic(problem), verbose=False, **kwargs)
+
+def test_lmcount_planner_3():
+    problem = butler_story(6, 6, compiled=True)
+    heuristic = LandmarkCountHeuristic(problem)
+    heuristic.accepted['stale'] = 0
+    runs = list()
+    for _ in range(2):
+        statistics = SearchStatistics()
+        planner(problem, heuristic=heuristic, search='gbfs', verbose=False,
+                statistics=statistics)
+        runs.append((statistics.expanded, dict(heuristic.accepted)))
+    # Each search starts without the accepted landmarks of the last one
+    assert 'stale' not in runs[0][1]
+    assert runs[0] == runs[1]
+    heuristic.clear()
+    assert heuristic.accepted == {}
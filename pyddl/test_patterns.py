@@ -0,0 +1,85 @@
+import pytest
+from pyddl.pyddl import *
+from pyddl.patterns import *
+from pyddl.heuristics import INF
+from pyddl.planner import planner
+from pyddl.search import SearchStatistics
+from pyddl.test_task import butler_problem
+from pyddl.test_heuristics import chain_problem
+from pyddl.benchmark import n_puzzle, manhattan_heuristic, EIGHT_PUZZLE
+
+def tiles(problem, numbers, blank=False):
+    """Pattern of the positions of some tiles of an n_puzzle (and of the blank)"""
+    return [atom for atom in problem.compile().atoms
+            if (atom[0] == 'at' and atom[1] in numbers) or (blank and atom[0] == 'blank')]
+
+@pytest.mark.parametrize('compiled', [False, True])
+def test_pattern_database_1(compiled):
+    problem = chain_problem(compiled=compiled)
+    state = problem.initial_state()
+    assert PatternDatabase(problem, [('at', 3)])(state) == 1
+    # The whole task: at 3 and at 4 cannot both hold
+    problem = chain_problem(compiled=compiled, static=True)
+    database = PatternDatabase(problem, [('at', n) for n in (1, 2, 3, 4)])
+    assert len(database) == 4
+    assert database(problem.initial_state()) == INF
+    # One group of mutually exclusive atoms: a slot per atom, and for none
+    assert database.groups == [[0, 1, 2, 3]]
+    assert len(database.distances) == 5
+
+@pytest.mark.parametrize('compiled', [False, True])
+def test_pattern_database_2(compiled):
+    problem = butler_problem(compiled=compiled)
+    optimal = len(planner(problem, verbose=False))
+    state = problem.initial_state()
+    # Carry the wine to the lord, who drinks it and falls down
+    assert PatternDatabase(problem, ['lord'])(state) == 3
+    assert 3 <= PatternDatabase(problem, ['lord', 'wine'])(state) <= optimal
+    # Patterns without goal atoms give no estimate
+    assert PatternDatabase(problem, ['poison'])(state) == 0
+
+def test_pattern_databases_1():
+    problem = n_puzzle(tiles=EIGHT_PUZZLE, compiled=True, static=True)
+    state = problem.initial_state()
+    # Additive single-tile patterns are the Manhattan distance
+    single = PatternDatabases(problem, [tiles(problem, [t]) for t in range(1, 9)])
+    assert single(state) == manhattan_heuristic(problem)(state)
+    expected = len(planner(problem, heuristic=manhattan_heuristic(problem), verbose=False))
+    expanded = dict()
+    for combine in (sum, max):
+        heuristic = PatternDatabases(problem, [tiles(problem, [1, 2, 3], True),
+                                               tiles(problem, [4, 5, 6], True),
+                                               tiles(problem, [7, 8], True)], combine)
+        assert heuristic(state) <= expected
+        statistics = SearchStatistics()
+        plan = planner(problem, heuristic=heuristic, verbose=False, statistics=statistics)
+        assert len(plan) == expected
+        expanded[combine] = statistics.expanded
+    manhattan = SearchStatistics()
+    planner(problem, heuristic=manhattan_heuristic(problem), verbose=False, statistics=manhattan)
+    assert expanded[sum] <= manhattan.expanded
+
+def test_pattern_databases_save_1(tmp_path):
+    problem = n_puzzle(size=3, moves=16, compiled=True, static=True)
+    heuristic = PatternDatabases(problem, [tiles(problem, [1, 2, 3], True),
+                                           tiles(problem, [4, 5, 6, 7])])
+    path = str(tmp_path / 'puzzle.pdb')
+    heuristic.save(path)
+    loaded = PatternDatabases.load(n_puzzle(size=3, moves=16, compiled=True, static=True), path)
+    assert loaded.combine is sum
+    state = problem.initial_state()
+    for action in planner(problem, heuristic=heuristic, verbose=False):
+        assert loaded(state) == heuristic(state)
+        state = state.apply(action)
+    assert loaded(state) == 0
+    with pytest.raises(Exception):
+        PatternDatabases.load(chain_problem(), path)
+    # Same goal, another grounding
+    other = n_puzzle(size=3, moves=16, compiled=True)
+    assert other.goal == problem.goal
+    with pytest.raises(Exception):
+        PatternDatabases.load(other, path)
+    with open(path, 'wb') as f:
+        f.write(b'garbage')
+    with pytest.raises(Exception):
+        PatternDatabases.load(problem, path)
@@ -0,0 +1,277 @@
+import os
+import pytest
+from pyddl.pyddl import *
+from pyddl.planner import *
+from pyddl.test_task import butler_problem, counter_problem
+from pyddl.test_heuristics import chain_problem
+
+PROBLEMS = [butler_problem, counter_problem]
+
+@pytest.mark.parametrize('transpositions', [None, 1, 1000])
+@pytest.mark.parametrize('compiled', [False, True])
+@pytest.mark.parametrize('make_problem', PROBLEMS)
+def test_planner_idastar_1(make_problem, compiled, transpositions):
+    problem = make_problem(compiled=compiled)
+    plan = planner(problem, verbose=False)
+    ida_plan = planner(problem, verbose=False, search='idastar',
+                       transpositions=transpositions)
+    assert len(ida_plan) == len(plan)
+    state = problem.initial_state()
+    for action in ida_plan:
+        assert state.is_applicable(action)
+        state = state.apply(action)
+    assert state.is_true(problem.goal)
+
+def test_planner_idastar_2():
+    problem = chain_problem()
+    assert planner(problem, verbose=False) is None
+    assert planner(problem, verbose=False, search='idastar') is None
+    assert len(planner(problem, verbose=False, search='idastar', goal=(('at', 4),))) == 2
+    assert planner(problem, verbose=False, search='idastar', goal=(('at', 1),)) == []
+    assert planner(problem, verbose=False, search='idastar', goal=(('edge', 4, 1),)) is None
+
+def test_planner_idastar_3():
+    problem = butler_problem()
+    plan = planner(problem, heuristic='hmax', verbose=False, search='idastar')
+    assert [action.name for action in plan] == ['Put-poison', 'Carry', 'Drink', 'Fall-down']
+
+def test_planner_search_invalid_1():
+    with pytest.raises(Exception):
+        planner(butler_problem(), verbose=False, search='dfs')
+
+def valid_plan(problem, plan):
+    state = problem.initial_state()
+    for action in plan:
+        if not state.is_applicable(action):
+            return False
+        state = state.apply(action)
+    return state.is_true(problem.goal)
+
+@pytest.mark.parametrize('search', ['astar', 'wastar', 'gbfs', 'ucs'])
+@pytest.mark.parametrize('make_problem', PROBLEMS)
+def test_planner_search_1(make_problem, search):
+    problem = make_problem(compiled=True)
+    plan = planner(problem, heuristic='hadd', verbose=False, search=search)
+    assert valid_plan(problem, plan)
+    if search in ('astar', 'ucs'):
+        assert len(plan) == len(planner(problem, verbose=False))
+
+def test_planner_search_2():
+    calls = []
+    def h(state):
+        calls.append(state)
+        return 0
+    problem = butler_problem()
+    planner(problem, heuristic=h, verbose=False, search='ucs')
+    assert calls == []
+    planner(problem, heuristic=h, verbose=False, search='wastar', weight=5)
+    assert calls != []
+
+@pytest.mark.parametrize('search', ['astar', 'wastar', 'gbfs'])
+def test_planner_dead_ends_1(search):
+    from pyddl.benchmark import butler_story
+    from pyddl.search import SearchStatistics
+    # The poison cannot be poisoned: dead ends are not expanded
+    problem = butler_story(3, 3).variant(goal=(('poisoned', 'poison'),))
+    for heuristic in ('hmax', 'lmcount'):
+        statistics = SearchStatistics()
+        assert planner(problem, heuristic=heuristic, verbose=False, search=search,
+                       statistics=statistics) is None
+        assert statistics.expanded == 0
+
+def test_planner_search_3(capsys):
+    problem = butler_problem()
+    for search in ('astar', 'gbfs', 'idastar'):
+        planner(problem, heuristic='ff', search=search)
+        lines = [line.split(':')[0] for line in capsys.readouterr().out.splitlines()
+                 if ':' in line and not line.startswith('Action')]
+        assert lines[-3:] == ['States Explored', 'Time per state', 'Plan length']
+
+@pytest.mark.parametrize('tie_breaking', ['lifo', 'fifo', 'low-h'])
+@pytest.mark.parametrize('make_problem', PROBLEMS)
+def test_planner_buckets_1(make_problem, tie_breaking):
+    problem = make_problem(compiled=True)
+    plan = planner(problem, heuristic='hmax', verbose=False, open_list='buckets',
+                   tie_breaking=tie_breaking)
+    assert valid_plan(problem, plan)
+    assert len(plan) == len(planner(problem, verbose=False))
+
+@pytest.mark.parametrize('workers', [1, 3])
+@pytest.mark.parametrize('compiled', [False, True])
+@pytest.mark.parametrize('make_problem', PROBLEMS)
+def test_planner_hdastar_1(make_problem, compiled, workers):
+    problem = make_problem(compiled=compiled)
+    plan = planner(problem, heuristic='hmax', verbose=False, search='hdastar',
+                   workers=workers)
+    assert valid_plan(problem, plan)
+    assert len(plan) == len(planner(problem, verbose=False))
+
+def test_planner_hdastar_2():
+    problem = chain_problem()
+    assert planner(problem, verbose=False, search='hdastar', workers=2) is None
+    assert len(planner(problem, verbose=False, search='hdastar', workers=2,
+                       goal=(('at', 4),))) == 2
+
+def test_portfolio_1():
+    from pyddl.parallel import portfolio, PORTFOLIO
+    problem = butler_problem(compiled=True)
+    plan, configuration = portfolio(problem, verbose=False)
+    assert valid_plan(problem, plan)
+    assert configuration in PORTFOLIO
+    plan, configuration = portfolio(problem, first=False, verbose=False)
+    assert len(plan) == len(planner(problem, verbose=False))
+
+def test_portfolio_2(capsys):
+    from pyddl.parallel import portfolio
+    problem = chain_problem()
+    configurations = [dict(search='dfs'), dict(search='idastar')]
+    assert portfolio(problem, configurations) == (None, None)
+    assert len(capsys.readouterr().out.splitlines()) == 2
+    plan, configuration = portfolio(problem, [dict(goal=(('at', 3),))],
+                                    deadline=10, verbose=False)
+    assert len(plan) == 1
+
+@pytest.mark.parametrize('compiled', [False, True])
+def test_solve_batch_1(compiled):
+    from pyddl.parallel import solve_batch
+    problem = counter_problem(compiled=compiled)
+    variants = [(None, None)] + [((('=', ('count',), n),), None) for n in range(4)] + \
+        [(None, (('done',), ('>', ('count',), 3)))]
+    results = list(solve_batch(problem, variants, workers=2, heuristic='hadd'))
+    assert sorted(index for index, _, _ in results) == list(range(len(variants)))
+    lengths = {index: stats['plan_length'] for index, _, stats in results}
+    assert lengths == {0: 4, 1: 4, 2: 3, 3: 2, 4: 1, 5: None}
+    for index, plan, stats in results:
+        if plan is not None:
+            assert valid_plan(problem.variant(*variants[index]), plan)
+        assert stats['expanded'] > 0 and stats['time'] >= stats['search_time']
+
+def test_solve_batch_2():
+    from pyddl.parallel import solve_batch
+    # Goals of a problem grounded with static can change, not its init
+    problem = counter_problem(static=True, compiled=True)
+    variants = [(None, None), (None, (('>=', ('count',), 2),))]
+    lengths = {index: stats['plan_length']
+               for index, _, stats in solve_batch(problem, variants, workers=2)}
+    assert lengths == {0: 4, 1: 2}
+    with pytest.raises(Exception):
+        list(solve_batch(problem, [((('=', ('count',), 1),), None)], workers=2))
+
+@pytest.mark.parametrize('search', ['astar', 'gbfs', 'ucs', 'idastar', 'hdastar'])
+def test_planner_statistics_1(search):
+    problem = butler_problem(compiled=True)
+    statistics = SearchStatistics()
+    plan = planner(problem, heuristic='hmax', verbose=False, search=search,
+                   workers=2, statistics=statistics)
+    assert statistics.plan_length == len(plan)
+    assert statistics.expanded >= len(plan)
+    assert statistics.generated >= statistics.expanded - 1
+    assert statistics.peak_open > 0
+    assert statistics.ground_time == problem.ground_time > 0
+    assert statistics.search_time > 0
+    if search == 'ucs':
+        assert statistics.evaluations == 0
+    else:
+        assert statistics.evaluations > 0 and statistics.heuristic_time > 0
+
+def test_planner_statistics_2(capsys):
+    problem = butler_problem()
+    planner(problem)
+    assert 'Action' not in capsys.readouterr().out
+    planner(problem, verbose=2)
+    assert 'Action' in capsys.readouterr().out
+
+@pytest.mark.parametrize('search', ['astar', 'gbfs', 'idastar', 'anytime'])
+def test_planner_budget_1(search):
+    problem = butler_problem(compiled=True)
+    statistics = SearchStatistics()
+    plan = planner(problem, verbose=False, search=search, max_expansions=2,
+                   statistics=statistics)
+    assert plan is None
+    assert statistics.exhausted == 'expansions'
+    assert statistics.expanded == 2
+    for budget in (dict(deadline=0), dict(max_memory=1)):
+        assert planner(problem, verbose=False, search=search, statistics=statistics,
+                       **budget) is None
+        assert statistics.exhausted in ('deadline', 'memory')
+    assert planner(problem, verbose=False, search=search, deadline=60,
+                   statistics=statistics) is not None
+    assert statistics.exhausted is None
+
+def test_planner_budget_2():
+    statistics = SearchStatistics()
+    assert planner(butler_problem(), verbose=False, search='hdastar', workers=2,
+                   deadline=0, statistics=statistics) is None
+    assert statistics.exhausted == 'deadline'
+    with pytest.raises(Exception):
+        planner(butler_problem(), verbose=False, search='hdastar', max_expansions=10)
+
+@pytest.mark.parametrize('make_problem', PROBLEMS)
+def test_planner_anytime_1(make_problem):
+    problem = make_problem(compiled=True)
+    statistics = SearchStatistics()
+    plan = planner(problem, heuristic='hmax', verbose=False, search='anytime',
+                   weight=5, statistics=statistics)
+    assert valid_plan(problem, plan)
+    assert len(plan) == len(planner(problem, verbose=False))
+    assert statistics.bound == 1.0 and statistics.exhausted is None
+
+def test_planner_anytime_2():
+    from pyddl.benchmark import n_puzzle, manhattan_heuristic
+    problem = n_puzzle(size=3, moves=40, seed=3, compiled=True)
+    h = manhattan_heuristic(problem)
+    optimal = len(planner(problem, heuristic=h, verbose=False))
+    found = dict()
+    for budget in (50, 200, 10**6):
+        statistics = SearchStatistics()
+        plan = planner(problem, heuristic=h, verbose=False, search='anytime',
+                       weight=5, max_expansions=budget, statistics=statistics)
+        if plan is not None:
+            assert valid_plan(problem, plan)
+            assert len(plan) <= statistics.bound * optimal + 1e-9
+            found[budget] = (len(plan), statistics.bound)
+    assert found[10**6] == (optimal, 1.0)
+
+def test_planner_hdastar_error_1():
+    # An error in a worker is raised by the coordinator, instead of hanging
+    def heuristic(state):
+        raise ValueError("broken heuristic")
+    for workers in (1, 2):
+        with pytest.raises(ValueError):
+            planner(butler_problem(), heuristic=heuristic, verbose=False,
+                    search='hdastar', workers=workers)
+    # A worker dying without a word is reported too
+    def heuristic(state):
+        os._exit(3)
+    with pytest.raises(Exception):
+        planner(butler_problem(), heuristic=heuristic, verbose=False,
+                search='hdastar', workers=2)
+
+def _session_processes():
+    """Ids of the other running (not zombie) processes of this session"""
+    session = os.getsid(0)
+    pids = set()
+    for name in os.listdir('/proc'):
+        if name.isdigit() and int(name) != os.getpid():
+            try:
+                with open(f'/proc/{name}/stat') as f:
+                    state = f.read().rsplit(')', 1)[1].split()[0]
+                if os.getsid(int(name)) == session and state != 'Z':
+                    pids.add(int(name))
+            except OSError:
+                pass
+    return pids
+
+@pytest.mark.skipif(not os.path.isdir('/proc'), reason='needs /proc')
+def test_portfolio_hdastar_1():
+    from pyddl.parallel import portfolio
+    from pyddl.benchmark import n_puzzle
+    import time
+    problem = n_puzzle(size=3, moves=30, compiled=True)
+    before = _session_processes()
+    configurations = [dict(heuristic='ff', search='gbfs'), dict(search='hdastar', workers=2)]
+    plan, configuration = portfolio(problem, configurations, verbose=False)
+    assert configuration == configurations[0]
+    # The HDA* workers of the losing configuration were killed with it
+    time.sleep(0.2)
+    assert _session_processes() - before == set()
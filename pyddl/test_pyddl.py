@@ -268,3 +268,182 @@ def test_state_is_true_3():
 
 
 
+def test_action_precomputed_1():
+    action = Action(
+            'Remove',
+            parameters=(
+                ('tire', 't'),
+                ('location', 'l')
+            ),
+            preconditions=(
+                ('at', 't', 'l'),
+                neg(('at', 't', 'ground')),
+                ('<=', ('t', 'l'), 3)
+            ),
+            effects=(
+                neg(('at', 't', 'l')),
+                ('at', 't', 'ground'),
+                ('+=', ('t', 'l'), 1),
+                ('-=', ('total',), 2),
+            ),
+        )
+    ground_action = action.ground('flat', 'axle')
+
+    assert ground_action.pos_preconditions == frozenset((('at', 'flat', 'axle'),))
+    assert ground_action.neg_preconditions == frozenset((('at', 'flat', 'ground'),))
+    assert len(ground_action.num_preconditions) == 1
+    assert ground_action.num_preconditions[0]({('flat', 'axle'): 3})
+    assert not ground_action.num_preconditions[0]({('flat', 'axle'): 4})
+    assert ground_action.add_effects == frozenset((('at', 'flat', 'ground'),))
+    assert ground_action.del_effects == frozenset((('at', 'flat', 'axle'),))
+    assert ground_action.num_effects == ((('flat', 'axle'), 1), (('total',), -2))
+
+def test_state_is_applicable_1():
+    action = Action(
+            'test',
+            preconditions=(
+                ('at', 'a', 'b'),
+                neg(('at', 'a', 'c')),
+                ('<', 'a', 3),
+            ),
+        )
+    ground_action = action.ground()
+
+    assert State((('at', 'a', 'b'), ('=', 'a', 2))).is_applicable(ground_action)
+    assert not State((('at', 'a', 'b'), ('=', 'a', 3))).is_applicable(ground_action)
+    assert not State((('at', 'a', 'b'), ('at', 'a', 'c'), ('=', 'a', 2))).is_applicable(ground_action)
+    assert not State((('=', 'a', 2),)).is_applicable(ground_action)
+
+def test_state_apply_3():
+    state = State((('at', 'a', 'b'), ('=', 'a', 1)))
+
+    action = Action(
+            'test',
+            effects=(
+                neg(('at', 'a', 'b')),
+                ('at', 'a', 'c'),
+                ('-=', 'a', 1),
+            ),
+        )
+    new_state = state.apply(action.ground())
+
+    assert new_state.predicates == frozenset((('at', 'a', 'c'), ('=', 'a', 0)))
+    assert new_state.cost == 1
+    assert new_state.plan()[0].sig == ('test',)
+
+def test_state_is_true_neg_1():
+    state = State((('at', 'a', 'b'),))
+    assert state.is_true((neg(('at', 'a', 'c')),))
+    assert not state.is_true((neg(('at', 'a', 'b')),))
+
+def slide_domain():
+    return Domain((
+        Action(
+            'move',
+            parameters=(
+                ('tile', 't'),
+                ('position', 'from'),
+                ('position', 'to'),
+            ),
+            preconditions=(
+                ('adjacent', 'from', 'to'),
+                ('at', 't', 'from'),
+                ('blank', 'to'),
+            ),
+            effects=(
+                neg(('at', 't', 'from')),
+                neg(('blank', 'to')),
+                ('at', 't', 'to'),
+                ('blank', 'from'),
+            ),
+        ),
+    ))
+
+def test_domain_ground_reachable_1():
+    domain = slide_domain()
+    objects = {'tile': ('a', 'b'), 'position': (1, 2, 3)}
+    init = (
+        ('adjacent', 1, 2), ('adjacent', 2, 1),
+        ('adjacent', 2, 3), ('adjacent', 3, 2),
+        ('at', 'a', 1), ('at', 'b', 2), ('blank', 3),
+    )
+    full = [a.sig for a in domain.ground(objects)]
+    pruned = [a.sig for a in domain.ground(objects, init)]
+
+    assert len(full) == 18
+    assert len(pruned) == 8
+    assert pruned == [sig for sig in full if sig in pruned]
+    assert ('move', 'b', 2, 3) in pruned
+    assert ('move', 'a', 1, 3) not in pruned
+
+def test_domain_ground_reachable_2():
+    domain = slide_domain()
+    objects = {'tile': ('a',), 'position': (1, 2, 3)}
+    init = (('adjacent', 1, 2), ('at', 'a', 2), ('blank', 3))
+
+    assert domain.ground(objects, init) == []
+
+def test_domain_ground_reachable_3():
+    domain = Domain((
+        Action(
+            'swap',
+            parameters=(
+                ('item', 'x'),
+                ('item', 'y'),
+            ),
+            preconditions=(
+                ('ready',),
+            ),
+            effects=(
+                ('swapped', 'x', 'y'),
+            ),
+            unique=True,
+            no_permute=True,
+        ),
+    ))
+    objects = {'item': ('a', 'b', 'c')}
+
+    assert [a.sig for a in domain.ground(objects, (('ready',),))] == \
+        [('swap', 'a', 'b'), ('swap', 'a', 'c'), ('swap', 'b', 'c')]
+    assert domain.ground(objects, ()) == []
+
+def test_domain_is_static_1():
+    domain = slide_domain()
+    assert domain.fluents == frozenset(('at', 'blank'))
+    assert domain.is_static(('adjacent', 1, 2))
+    assert domain.is_static(neg(('adjacent', 1, 2)))
+    assert not domain.is_static(('at', 'a', 1))
+    assert domain.is_static(('!=', 'a', 'b'))
+
+def test_domain_ground_static_1():
+    domain = slide_domain()
+    objects = {'tile': ('a', 'b'), 'position': (1, 2, 3)}
+    init = (('adjacent', 1, 2), ('adjacent', 2, 1), ('at', 'a', 1), ('blank', 2))
+    grounded = domain.ground(objects, init, prune=False, static=True)
+
+    assert [a.sig for a in grounded] == [('move', 'a', 1, 2), ('move', 'a', 2, 1),
+                                         ('move', 'b', 1, 2), ('move', 'b', 2, 1)]
+    assert grounded[0].preconditions == [('at', 'a', 1), ('blank', 2)]
+    assert grounded[0].pos_preconditions == frozenset((('at', 'a', 1), ('blank', 2)))
+
+def test_problem_static_1():
+    init = (('adjacent', 1, 2), ('adjacent', 2, 1), ('at', 'a', 1), ('blank', 2))
+    problem = Problem(
+        slide_domain(),
+        {'tile': ('a',), 'position': (1, 2)},
+        init=init,
+        goal=(('adjacent', 1, 2), ('at', 'a', 2)),
+        static=True,
+    )
+    assert problem.static == frozenset((('adjacent', 1, 2), ('adjacent', 2, 1)))
+    assert problem.init == (('at', 'a', 1), ('blank', 2))
+    assert problem.goal == (('at', 'a', 2),)
+
+    problem = Problem(
+        slide_domain(),
+        {'tile': ('a',), 'position': (1, 2)},
+        init=init,
+        goal=(('adjacent', 2, 2), ('at', 'a', 2)),
+        static=True,
+    )
+    assert problem.goal == (('adjacent', 2, 2), ('at', 'a', 2))
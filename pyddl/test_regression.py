@@ -0,0 +1,83 @@
+import pytest
+from pyddl.pyddl import *
+from pyddl.regression import *
+from pyddl.planner import planner
+from pyddl.search import SearchStatistics
+from pyddl.test_task import butler_problem, counter_problem
+from pyddl.test_heuristics import chain_problem
+from pyddl.benchmark import butler_story
+
+def test_regression_regress_1():
+    problem = chain_problem(static=True)
+    regression = Regression(problem)
+    task = regression.task
+    at4 = (task.encode([('at', 4)]), 0)
+    regressed = regression.regress(at4)
+    assert [str(action) for action, _ in regressed] == ['step(3, 4)']
+    assert task.decode(regressed[0][1][0]) == [('at', 3)]
+    assert task.decode(regressed[0][1][1]) == []
+    # step(3, 4) deletes at 3, so cannot reach both at 3 and at 4
+    both = (task.encode([('at', 3), ('at', 4)]), 0)
+    assert sorted(str(action) for action, _ in regression.regress(both)) == \
+        ['step(1, 3)', 'step(2, 3)']
+
+def test_regression_numeric_1():
+    with pytest.raises(Exception):
+        planner(counter_problem(), verbose=False, search='regression')
+
+@pytest.mark.parametrize('search', ['regression', 'bidirectional'])
+@pytest.mark.parametrize('compiled', [False, True])
+def test_regression_search_1(compiled, search):
+    for problem in (butler_problem(compiled=compiled), butler_story(4, 3, compiled=compiled)):
+        plan = planner(problem, verbose=False, search=search)
+        assert len(plan) == len(planner(problem, heuristic='hmax', verbose=False))
+        state = problem.initial_state()
+        for action in plan:
+            assert state.is_applicable(action)
+            state = state.apply(action)
+        assert state.is_true(problem.goal)
+
+@pytest.mark.parametrize('search', ['regression', 'bidirectional'])
+def test_regression_search_2(search):
+    problem = chain_problem()
+    assert planner(problem, verbose=False, search=search) is None
+    assert len(planner(problem, verbose=False, search=search, goal=(('at', 4),))) == 2
+    assert planner(problem, verbose=False, search=search, goal=(('at', 1),)) == []
+    assert planner(problem, verbose=False, search=search,
+                   goal=(neg(('at', 1)), ('at', 3))) is not None
+    with pytest.raises(Exception):
+        planner(problem, verbose=False, search=search, hooks=object())
+    with pytest.raises(Exception):
+        planner(problem, verbose=False, search=search, heuristic='hmax')
+
+def test_regression_search_3():
+    problem = butler_story(6, 6, compiled=True)
+    statistics = SearchStatistics()
+    planner(problem, verbose=False, search='regression', statistics=statistics)
+    assert 0 < statistics.expanded < 50
+    assert planner(problem, verbose=False, search='regression', max_expansions=1,
+                   statistics=statistics) is None
+    assert statistics.exhausted == 'expansions'
+
+def test_regression_mutexes_1():
+    problem = chain_problem(static=True)
+    regression = Regression(problem, problem.initial_state())
+    task = regression.task
+    # Only one position at a time
+    assert regression.consistent(task.encode([('at', 3)]))
+    assert not regression.consistent(task.encode([('at', 3), ('at', 4)]))
+    assert regression.partial_state(Action('goal', preconditions=(
+        ('at', 3), ('at', 4))).ground()) is None
+    both = (task.encode([('at', 3), ('at', 4)]), 0)
+    assert regression.regress(both) == []
+
+@pytest.mark.parametrize('search', ['regression', 'bidirectional'])
+def test_regression_mutexes_2(search):
+    from pyddl.benchmark import n_puzzle
+    # Partial states with a tile in two cells, or a cell blank and occupied
+    # are pruned, or the search would not end
+    problem = n_puzzle(3, moves=12, seed=1, compiled=True)
+    statistics = SearchStatistics()
+    plan = planner(problem, verbose=False, search=search, statistics=statistics)
+    assert len(plan) == len(planner(problem, heuristic='hmax', verbose=False))
+    assert statistics.expanded < 1000
@@ -0,0 +1,118 @@
+import os
+import pytest
+from pyddl.pyddl import *
+from pyddl.search import *
+from pyddl.planner import planner
+from pyddl.test_task import butler_problem
+
+def test_node_table_insert_1():
+    table = NodeTable()
+    a, b = State((('a',),)), State((('b',),))
+
+    assert table.insert(a, 0) == (0, True)
+    assert table.insert(b, 5, 0, 3) == (1, True)
+    assert table.insert(State((('b',),)), 6, 0, 4) == (1, False)
+    assert table.insert(b, 2, 0, 4) == (1, True)
+    assert len(table) == 2
+
+    node = table[1]
+    assert (node.state, node.g, node.parent, node.action) == (1, 2, 0, 4)
+
+    table.closed[1] = 1
+    assert table.insert(b, 1, 0, 5) == (1, False)
+    assert table.g[1] == 2
+
+def test_node_table_plan_1():
+    table = NodeTable()
+    actions = ['x', 'y', 'z']
+    table.insert(State(()), 0)
+    table.insert(State((('a',),)), 1, 0, 2)
+    table.insert(State((('b',),)), 2, 1, 0)
+
+    assert table.plan(2, actions) == ['z', 'x']
+    assert table.plan(0, actions) == []
+
+def test_state_successor_1():
+    problem = butler_problem()
+    action = problem.grounded_actions[0]
+    state = problem.initial_state().apply(action)
+    successor = state.successor(problem.grounded_actions[1])
+
+    assert successor.cost == 0 and successor.predecessor is None
+    assert state.cost == 1 and state.predecessor[1] is action
+
+@pytest.mark.parametrize('compiled', [False, True])
+def test_planner_state0_1(compiled):
+    problem = butler_problem(compiled=compiled)
+    plan = planner(problem, verbose=False)
+    state = problem.initial_state().apply(plan[0])
+
+    assert problem.grounded_actions[plan[0].index] is plan[0]
+    assert planner(problem, state0=state, verbose=False) == plan[1:]
+
+def pop_all(open_list):
+    items = list()
+    while len(open_list):
+        items.append(open_list.pop())
+    return items
+
+def fill(open_list):
+    # (f, g, h, item)
+    for entry in [(3, 1, 2, 'a'), (2, 0, 2, 'b'), (3, 2, 1, 'c'), (3, 1, 2, 'd'), (4, 0, 4, 'e')]:
+        open_list.push(*entry)
+    return open_list
+
+def test_heap_open_list_1():
+    assert pop_all(fill(HeapOpenList())) == ['b', 'c', 'a', 'd', 'e']
+
+@pytest.mark.parametrize('tie_breaking, expected', [
+    ('lifo', ['b', 'd', 'c', 'a', 'e']),
+    ('fifo', ['b', 'a', 'c', 'd', 'e']),
+    ('low-h', ['b', 'c', 'd', 'a', 'e']),
+])
+def test_bucket_open_list_1(tie_breaking, expected):
+    assert pop_all(fill(BucketOpenList(tie_breaking))) == expected
+
+def test_bucket_open_list_2():
+    open_list = BucketOpenList('fifo')
+    open_list.push(5, 0, 5, 'a')
+    assert open_list.pop() == 'a'
+    open_list.push(2, 0, 2, 'b')
+    open_list.push(1, 0, 1, 'c')
+    assert pop_all(open_list) == ['c', 'b']
+    with pytest.raises(Exception):
+        BucketOpenList('random')
+
+def test_search_statistics_1():
+    statistics = SearchStatistics()
+    assert statistics.expanded == 0 and statistics.plan_length is None
+    assert statistics.expansions_per_sec == 0.0
+    statistics.expanded, statistics.search_time = 10, 2.0
+    assert statistics.expansions_per_sec == 5.0
+    assert set(statistics.as_dict()) == set(SearchStatistics.FIELDS)
+    assert 'expanded=10' in str(statistics)
+
+def test_search_budget_1():
+    budget = SearchBudget(max_expansions=100)
+    assert budget.start() == 0
+    assert budget.next_check(0) == 64
+    assert budget.next_check(64) == 100
+    assert budget.exhausted(99) is None
+    assert budget.exhausted(100) == 'expansions'
+    budget = SearchBudget(deadline=0)
+    budget.start()
+    assert budget.exhausted(0) == 'deadline'
+    assert SearchBudget(max_memory=1).exhausted(0) == 'memory'
+    assert SearchBudget(deadline=60, max_memory=2**50).exhausted(10**6) is None
+
+@pytest.mark.skipif(not os.path.exists('/proc/self/statm'), reason="needs /proc")
+def test_search_budget_memory_1():
+    # A process peak above the limit does not exhaust later searches
+    block = bytearray(300 * 2**20)
+    del block
+    limit = current_memory() + 200 * 2**20
+    assert SearchBudget(max_memory=limit).exhausted(0) is None
+    statistics = SearchStatistics()
+    assert planner(butler_problem(compiled=True), verbose=False, max_memory=limit,
+                   statistics=statistics) is not None
+    assert statistics.exhausted is None and statistics.expanded > 0
@@ -0,0 +1,47 @@
+import pytest
+from pyddl.pyddl import *
+from pyddl.successors import *
+from pyddl.test_task import butler_problem, counter_problem
+
+def reachable_states(problem, limit=200):
+    state = problem.initial_state()
+    seen = {state}
+    fringe = [state]
+    while fringe and len(seen) < limit:
+        node = fringe.pop()
+        for action in problem.grounded_actions:
+            if node.is_applicable(action):
+                successor = node.apply(action)
+                if successor not in seen:
+                    seen.add(successor)
+                    fringe.append(successor)
+    return seen
+
+@pytest.mark.parametrize('compiled', [False, True])
+@pytest.mark.parametrize('make_problem', [butler_problem, counter_problem])
+def test_successor_generator_1(make_problem, compiled):
+    problem = make_problem(compiled=compiled)
+    generator = problem.successor_generator()
+    for state in reachable_states(problem):
+        expected = [a for a in problem.grounded_actions if state.is_applicable(a)]
+        assert sorted(generator.applicable(state), key=str) == sorted(expected, key=str)
+
+def test_successor_generator_2():
+    actions = [
+        Action('a', preconditions=(('p',),)).ground(),
+        Action('b', preconditions=(('p',), ('q',))).ground(),
+        Action('c', preconditions=(('q',), neg(('r',)))).ground(),
+        Action('d').ground(),
+    ]
+    generator = SuccessorGenerator(actions)
+    names = lambda state: sorted(a.name for a in generator.applicable(state))
+    assert names(State(())) == ['d']
+    assert names(State((('p',),))) == ['a', 'd']
+    assert names(State((('p',), ('q',)))) == ['a', 'b', 'c', 'd']
+    assert names(State((('p',), ('q',), ('r',)))) == ['a', 'b', 'd']
+
+def test_problem_successor_generator_1():
+    problem = butler_problem()
+    assert problem.successor_generator() is problem.successor_generator()
+    assert problem.successor_generator().task is None
+    assert butler_problem(compiled=True).successor_generator().task is not None
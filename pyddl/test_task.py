@@ -0,0 +1,272 @@
+import pytest
+from pyddl.pyddl import *
+from pyddl.task import *
+from pyddl.planner import planner
+
+def butler_problem(**kwargs):
+    domain = Domain((
+        Action(
+            'Put-poison',
+            parameters=(
+                ('owner', 'o'),
+            ),
+            preconditions=(
+                ('have', 'o', 'poison'),
+                ('have', 'o', 'wine'),
+            ),
+            effects=(
+                neg(('have', 'o', 'poison')),
+                ('poisoned', 'wine'),
+            ),
+        ),
+        Action(
+            'Carry',
+            parameters=(
+                ('owner', 'from'),
+                ('object', 'obj'),
+                ('owner', 'to'),
+            ),
+            preconditions=(
+                ('have', 'from', 'obj'),
+                ('!=', 'from', 'to'),
+            ),
+            effects=(
+                neg(('have', 'from', 'obj')),
+                ('have', 'to', 'obj'),
+            ),
+        ),
+        Action(
+            'Drink',
+            parameters=(
+                ('owner', 'o'),
+                ('object', 'obj'),
+            ),
+            preconditions=(
+                ('have', 'o', 'obj'),
+            ),
+            effects=(
+                neg(('have', 'o', 'obj')),
+                ('drinking', 'o', 'obj'),
+            ),
+        ),
+        Action(
+            'Fall-down',
+            parameters=(
+                ('owner', 'o'),
+                ('object', 'obj'),
+            ),
+            preconditions=(
+                ('drinking', 'o', 'obj'),
+                ('poisoned', 'obj')
+            ),
+            effects=(
+                ('dead', 'o'),
+                neg(('drinking', 'o', 'obj')),
+            ),
+        ),
+    ))
+    return Problem(
+        domain,
+        {
+            'owner': ('butler', 'lord'),
+            'object': ('wine', 'poison'),
+        },
+        init=(
+            ('have', 'butler', 'poison'),
+            ('have', 'butler', 'wine'),
+        ),
+        goal=(
+            ('dead', 'lord'),
+        ),
+        **kwargs
+    )
+
+def counter_problem(**kwargs):
+    domain = Domain((
+        Action(
+            'inc',
+            preconditions=(
+                ('<', ('count',), 3),
+            ),
+            effects=(
+                ('+=', ('count',), 1),
+            ),
+        ),
+        Action(
+            'done',
+            preconditions=(
+                ('=', ('count',), 3),
+                neg(('done',)),
+            ),
+            effects=(
+                ('done',),
+            ),
+        ),
+    ))
+    return Problem(
+        domain,
+        {},
+        init=(
+            ('=', ('count',), 0),
+        ),
+        goal=(
+            ('done',),
+        ),
+        **kwargs
+    )
+
+def test_task_intern_1():
+    task = butler_problem().compile()
+    atom_id = task.intern(('have', 'butler', 'wine'))
+    assert task.atoms[atom_id] == ('have', 'butler', 'wine')
+    assert task.intern(('have', 'butler', 'wine')) == atom_id
+
+def test_task_encode_decode_1():
+    task = butler_problem().compile()
+    atoms = [('have', 'butler', 'wine'), ('dead', 'lord')]
+    assert set(task.decode(task.encode(atoms))) == set(atoms)
+    assert task.decode(0) == []
+
+def test_problem_compile_1():
+    problem = butler_problem()
+    assert problem.compile() is problem.compile()
+    assert isinstance(problem.initial_state(), State)
+    assert isinstance(butler_problem(compiled=True).initial_state(), PackedState)
+
+def test_packed_state_predicates_1():
+    problem = counter_problem(compiled=True)
+    state = problem.initial_state()
+    assert state.predicates == State(problem.init).predicates
+
+def test_packed_state_matches_state_1():
+    problem = butler_problem()
+    state = problem.initial_state()
+    packed = problem.compile().initial_state()
+    for action in problem.grounded_actions:
+        assert packed.is_true(action.preconditions) == state.is_true(action.preconditions)
+        assert packed.is_applicable(action) == state.is_applicable(action)
+        if state.is_applicable(action):
+            assert packed.apply(action).predicates == state.apply(action).predicates
+
+def test_packed_state_apply_numeric_1():
+    problem = counter_problem(compiled=True)
+    inc, done = problem.grounded_actions
+    state = problem.initial_state()
+    for _ in range(3):
+        assert state.is_true(inc.preconditions)
+        assert not state.is_true(done.preconditions)
+        state = state.apply(inc)
+    assert not state.is_true(inc.preconditions)
+    assert state.is_true(done.preconditions)
+    state = state.apply(done)
+    assert not state.is_true(done.preconditions)
+    assert state.is_true(problem.goal)
+
+def test_task_compile_action_1():
+    problem = butler_problem()
+    task = problem.compile()
+    action = problem.grounded_actions[0]
+    pos, neg, add, delete, num, delta = action.compiled
+    assert set(task.decode(pos)) == action.pos_preconditions
+    assert set(task.decode(add)) == action.add_effects
+    assert set(task.decode(delete)) == action.del_effects
+    assert neg == 0
+    assert num == () and delta is None
+
+def test_packed_state_hash_1():
+    problem = butler_problem(compiled=True)
+    state = problem.initial_state()
+    carry = [a for a in problem.grounded_actions if a.sig == ('Carry', 'butler', 'wine', 'lord')][0]
+    back = [a for a in problem.grounded_actions if a.sig == ('Carry', 'lord', 'wine', 'butler')][0]
+    other = state.apply(carry).apply(back)
+    assert other == state
+    assert hash(other) == hash(state)
+    assert other != state.apply(carry)
+
+@pytest.mark.parametrize('make_problem', [butler_problem, counter_problem])
+def test_planner_compiled_1(make_problem):
+    plan = planner(make_problem(), verbose=False)
+    compiled_plan = planner(make_problem(compiled=True), verbose=False)
+    assert compiled_plan is not None
+    assert len(compiled_plan) == len(plan)
+
+@pytest.mark.parametrize('make_problem', [butler_problem, counter_problem])
+def test_planner_pruned_1(make_problem):
+    plan = planner(make_problem(), verbose=False)
+    problem = make_problem(prune=True)
+    pruned_plan = planner(problem, verbose=False)
+    assert len(problem.grounded_actions) <= len(make_problem().grounded_actions)
+    assert pruned_plan is not None
+    assert len(pruned_plan) == len(plan)
+
+@pytest.mark.parametrize('make_problem', [butler_problem, counter_problem])
+def test_planner_static_1(make_problem):
+    plan = planner(make_problem(), verbose=False)
+    problem = make_problem(static=True, compiled=True)
+    static_plan = planner(problem, verbose=False)
+    assert static_plan is not None
+    assert len(static_plan) == len(plan)
+    assert all(not pre[0] == '!=' for action in problem.grounded_actions
+               for pre in action.preconditions)
+
+def test_task_functions_1():
+    task = counter_problem().compile()
+    assert task.functions == [('count',)]
+    assert task.function_ids == {('count',): 0}
+    assert task.init_fluents == (0,)
+
+def test_packed_state_fluents_1():
+    problem = counter_problem(compiled=True)
+    inc = problem.grounded_actions[0]
+    state = problem.initial_state().apply(inc).apply(inc)
+    assert inc.compiled[5] == (1,)
+    assert state.fluents == (2,)
+    assert ('=', ('count',), 2) in state.predicates
+    assert state.is_true((('>', ('count',), 1), ('<=', 2, ('count',))))
+    assert not state.is_true((('>', ('count',), ('count',)),))
+
+def test_packed_state_zobrist_1():
+    problem = butler_problem(compiled=True)
+    task = problem.compile()
+    state = problem.initial_state()
+    assert state.zobrist == task.zobrist(state.bits)
+    for action in planner(problem, verbose=False):
+        state = state.successor(action)
+        assert state.zobrist == task.zobrist(state.bits)
+    assert hash(state) == state.zobrist
+
+def test_task_zobrist_keys_1():
+    assert butler_problem().compile().keys == butler_problem().compile().keys
+    keys = butler_problem().compile().keys
+    assert len(set(keys)) == len(keys)
+    assert all(0 <= key < 2**64 for key in keys)
+
+@pytest.mark.parametrize('compiled', [False, True])
+def test_problem_variant_1(compiled):
+    problem = counter_problem(compiled=compiled)
+    variant = problem.variant(goal=(('>=', ('count',), 1),))
+    assert variant.grounded_actions is problem.grounded_actions
+    assert variant.successor_generator() is problem.successor_generator()
+    assert variant.init == problem.init
+    assert len(planner(variant, verbose=False)) == 1
+    assert len(planner(problem, verbose=False)) > 1
+
+@pytest.mark.parametrize('compiled', [False, True])
+def test_problem_variant_2(compiled):
+    problem = counter_problem(compiled=compiled)
+    variant = problem.variant(init=(('=', ('count',), 2),))
+    assert [action.name for action in planner(variant, verbose=False)] == ['inc', 'done']
+    with pytest.raises(Exception):
+        counter_problem(prune=True).variant(init=())
+
+@pytest.mark.parametrize('compiled', [False, True])
+def test_problem_variant_static_1(compiled):
+    from pyddl.benchmark import n_puzzle
+    problem = n_puzzle(size=2, moves=4, static=True, compiled=compiled)
+    expected = len(planner(problem, verbose=False))
+    # Static goals are evaluated against init, as for the problem's own goal
+    holds = problem.variant(goal=problem.goal + (('inc', 1, 2),))
+    assert holds.goal == problem.goal
+    assert len(planner(holds, verbose=False)) == expected
+    fails = problem.variant(goal=problem.goal + (('inc', 2, 1),))
+    assert planner(fails, verbose=False) is None
@@ -0,0 +1,72 @@
+import pytest
+from pyddl.pyddl import *
+from pyddl.topk import *
+from pyddl.planner import planner
+from pyddl.search import SearchStatistics
+from pyddl.test_task import butler_problem
+from pyddl.test_heuristics import chain_problem
+from pyddl.benchmark import butler_story
+
+def simple_plans(problem, max_length):
+    """Every plan without repeated states, up to max_length, by depth-first search"""
+    plans = list()
+    def _search(state, visited, plan):
+        if state.is_true(problem.goal):
+            plans.append(list(plan))
+        if len(plan) == max_length:
+            return
+        for action in problem.grounded_actions:
+            if state.is_applicable(action):
+                successor = state.apply(action)
+                if successor not in visited:
+                    _search(successor, visited | {successor}, plan + [action])
+    state0 = problem.initial_state()
+    _search(state0, {state0}, [])
+    return plans
+
+def test_topk_chain_1():
+    problem = chain_problem()
+    plans = list(top_k_plans(problem, goal=(('at', 4),)))
+    assert [list(map(str, plan)) for plan in plans] == [
+        ['step(1, 3)', 'step(3, 4)'],
+        ['step(1, 2)', 'step(2, 3)', 'step(3, 4)'],
+    ]
+    assert list(top_k_plans(problem, goal=(('at', 1),))) == [[]]
+    assert list(top_k_plans(problem)) == []
+    # The butler problem has three plans without repeated states
+    assert len(list(top_k_plans(butler_problem(), 10))) == 3
+
+@pytest.mark.parametrize('compiled', [False, True])
+@pytest.mark.parametrize('heuristic', [None, 'hmax'])
+def test_topk_butler_1(compiled, heuristic):
+    problem = butler_story(3, 2, compiled=compiled)
+    plans = list(top_k_plans(problem, 20, heuristic=heuristic))
+    assert len(plans) == 20
+    assert len(plans[0]) == len(planner(problem, verbose=False))
+    lengths = [len(plan) for plan in plans]
+    assert lengths == sorted(lengths)
+    assert len(set(tuple(plan) for plan in plans)) == 20
+    # The same plans as exhaustive enumeration, up to the longest found
+    expected = simple_plans(problem, lengths[-1])
+    assert sorted(lengths) == sorted(len(plan) for plan in expected)[:20]
+    shorter = [tuple(plan) for plan in expected if len(plan) < lengths[-1]]
+    assert set(shorter) <= set(tuple(plan) for plan in plans)
+
+def test_topk_statistics_1():
+    problem = butler_problem()
+    statistics = SearchStatistics()
+    plans = top_k_plans(problem, heuristic='hmax', statistics=statistics)
+    next(plans)
+    expanded = statistics.expanded
+    next(plans)
+    assert statistics.expanded >= expanded
+    assert statistics.plan_length is not None
+
+def test_topk_diverse_1():
+    problem = butler_problem()
+    assert plan_distance([], []) == 0
+    plans = list(top_k_plans(problem, 3, distance=0.5))
+    assert len(plans[0]) == len(planner(problem, verbose=False))
+    for i, plan in enumerate(plans):
+        for other in plans[:i]:
+            assert plan_distance(plan, other) >= 0.5
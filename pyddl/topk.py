@@ -0,0 +1,143 @@
+"""
+Enumeration of many plans from a single search.
+
+A forward A* search records every edge (parent, action) into each state
+it generates. Plans are then enumerated backwards from the expanded goal
+states along the recorded edges, best-first on the length of the whole
+plan: the exact path cost g of the state reached, plus the length of the
+suffix built so far. The forward search is only resumed as far as needed
+for every plan up to the next length to be recorded, so plans come out
+shortest first, and asking for more plans continues the same search
+instead of solving the problem again.
+"""
+import heapq
+from itertools import count
+from time import perf_counter
+from .pyddl import Action
+from .heuristics import HEURISTICS, INF
+from .search import NodeTable, SearchStatistics
+
+def plan_distance(plan1, plan2):
+    """
+    Jaccard distance between the sets of actions of two plans:
+    0 for plans with the same actions, 1 for plans with no action in common
+    """
+    actions1, actions2 = set(plan1), set(plan2)
+    union = actions1 | actions2
+    if not union:
+        return 0.0
+    return 1.0 - len(actions1 & actions2) / len(union)
+
+def top_k_plans(problem, k=None, heuristic=None, state0=None, goal=None,
+                monotone=False, distance=0.0, statistics=None):
+    """
+    Yields up to k distinct plans (every plan, if k is None) without
+    repeated states, shortest first
+    @arg problem : a pyddl Problem
+    @arg k : the number of plans to yield
+    @arg heuristic : as for planner(); must be consistent (such as h_max),
+                     so that expanded states have their exact path costs
+    @arg state0 : initial state (problem.initial_state by default)
+    @arg goal : goal predicates and numerical conditions (problem.goal by default)
+    @arg monotone : if True, only applies actions by ignoring delete lists
+    @arg distance : the smallest plan_distance() of a plan to every plan
+                    yielded before it (0 for top-k, higher for diverse plans)
+    @arg statistics : if given, a SearchStatistics kept up to date with the
+                      forward search
+    """
+    if heuristic is None:
+        heuristic = lambda state: 0
+    elif isinstance(heuristic, str):
+        heuristic = HEURISTICS[heuristic](problem)
+    if statistics is None:
+        statistics = SearchStatistics()
+    if state0 is None:
+        state0 = problem.initial_state()
+    if goal is None:
+        goal = problem.goal
+    goal = Action('goal', preconditions=tuple(goal)).ground()
+    successor_generator = problem.successor_generator()
+    actions = problem.grounded_actions
+
+    table = NodeTable()
+    root, _ = table.insert(state0, 0)
+    # Recorded (parent, action index) edges into each state, and the
+    # suffixes already built from each state, to extend with later edges
+    incoming = [list()]
+    suffixes = [list()]
+    h = heuristic(state0)
+    statistics.evaluations += 1
+    fringe = list()
+    if h < INF:
+        fringe.append((h, 0, 0, root))
+    counter = count()
+    # Partial plans: (plan length, counter, state, suffix length, suffix),
+    # with suffix a linked list (action index, state reached, rest)
+    partial_plans = list()
+
+    def _push(key, node, length, suffix):
+        heapq.heappush(partial_plans, (key, next(counter), node, length, suffix))
+
+    def _expand():
+        """Expands the next state of the forward search"""
+        while fringe:
+            _, _, g, i = heapq.heappop(fringe)
+            if not table.closed[i] and g == table.g[i]:
+                break
+        else:
+            return
+        table.closed[i] = 1
+        statistics.expanded += 1
+        state = table.states[i]
+        if state.is_applicable(goal):
+            _push(g, i, 0, None)
+        for action in successor_generator.applicable(state):
+            successor = state.successor(action, monotone)
+            statistics.generated += 1
+            j, improved = table.insert(successor, g + 1, i, action.index)
+            if j == len(incoming):
+                incoming.append(list())
+                suffixes.append(list())
+            incoming[j].append((i, action.index))
+            for length, suffix in suffixes[j]:
+                _push(g + 1 + length, i, length + 1, (action.index, j, suffix))
+            if improved:
+                start = perf_counter()
+                h = heuristic(successor)
+                statistics.heuristic_time += perf_counter() - start
+                statistics.evaluations += 1
+                if g + 1 + h < INF:
+                    heapq.heappush(fringe, (g + 1 + h, -(g + 1), g + 1, j))
+            else:
+                statistics.duplicates += 1
+        statistics.peak_open = max(statistics.peak_open, len(fringe))
+
+    found = list()
+    while k is None or len(found) < k:
+        # Every plan of length up to that of the next partial plan must
+        # have its edges recorded: expand all states with f up to it
+        while fringe and (not partial_plans or fringe[0][0] <= partial_plans[0][0]):
+            _expand()
+        if not partial_plans:
+            return
+        key, _, node, length, suffix = heapq.heappop(partial_plans)
+        if node == root:
+            plan = list()
+            while suffix is not None:
+                plan.append(actions[suffix[0]])
+                suffix = suffix[2]
+            if all(plan_distance(plan, other) >= distance for other in found):
+                found.append(plan)
+                statistics.plan_length = len(plan)
+                yield plan
+            continue
+        suffixes[node].append((length, suffix))
+        # States on the suffix, not to be visited again
+        visited = {node}
+        rest = suffix
+        while rest is not None:
+            visited.add(rest[1])
+            rest = rest[2]
+        for parent, action in incoming[node]:
+            if parent not in visited:
+                _push(table.g[parent] + 1 + length, parent, length + 1, (action, node, suffix))